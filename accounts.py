@@ -0,0 +1,86 @@
+import hashlib
+import hmac
+import os
+import threading
+
+# Stored as pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+HASH_SCHEME = 'pbkdf2_sha256'
+HASH_ITERATIONS = 260_000
+SALT_BYTES = 16
+
+
+def hash_password(password, iterations=HASH_ITERATIONS):
+    """Salted PBKDF2-SHA256 hash of a password, with its parameters"""
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f'{HASH_SCHEME}${iterations}${salt.hex()}${digest.hex()}'
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(HASH_SCHEME + '$')
+
+
+def verify_password(password, stored):
+    """Whether a password matches a stored hash (constant-time comparison)"""
+    if not is_hashed(stored) or not isinstance(password, str):
+        return False
+    try:
+        _, iterations, salt, expected = stored.split('$')
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        # Malformed hash (wrong field count, bad hex or iteration count): never matches
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+# Checked against for unknown usernames so a miss costs as much as a wrong password
+_UNKNOWN_USER_HASH = hash_password('')
+
+
+class UserIndex:
+    """In-memory username -> user record index in front of the store.
+
+    Loaded once at startup; signups go to the store (one indexed insert)
+    and into the index. A username missing from the index is looked up in
+    the store once, so users created by another worker process can log in
+    everywhere.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._users = {user['username']: user for user in store.load_users()}
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, username):
+        """User record for a username, or None"""
+        user = self._users.get(username)
+        if user is None and username is not None:
+            user = self.store.get_user(username)
+            if user is not None:
+                with self._lock:
+                    self._users[username] = user
+        return user
+
+    def authenticate(self, username, password):
+        """The user record if the credentials match, else None"""
+        user = self.get(username)
+        if user is None:
+            verify_password(password or '', _UNKNOWN_USER_HASH)
+            return None
+        return user if verify_password(password, user['password']) else None
+
+    def create(self, username, password, email):
+        """Store a new user with a hashed password; returns their id, or None if the username is taken"""
+        if self.get(username) is not None:
+            return None
+        password_hash = hash_password(password)
+        user_id = self.store.create_user(username, password_hash, email)
+        if user_id is not None:
+            with self._lock:
+                self._users[username] = {
+                    'user_id': user_id, 'username': username, 'password': password_hash, 'email': email
+                }
+        return user_id
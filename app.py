@@ -1,19 +1,139 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from recommendation_system import MovieRecommender
-import pandas as pd
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g, Response
+from accounts import UserIndex
+from metrics import Metrics
+from recommendation_system import BATCH_METHODS, RATING_METHODS, MovieRecommender
+from precompute import PrecomputedRecommendations
+from rating_batch import MAX_BATCH_ROWS, MAX_REPORTED_ERRORS, ratings_frame, request_items, validate_ratings
+from rebuild_scheduler import RebuildScheduler
+from responses import CataloguePayload, EncodedJSON, json_response, page_limit
+from shared_model import SharedModel, publish_if_missing
+from storage import RecommenderStore
+import hmac
 import os
+import time
 
 app = Flask(__name__)
 app.secret_key = 'tamil_movie_recommender_secret_key_2024'
-recommender = MovieRecommender()
 
-# Load users data
+# Request, rebuild and (with RECOMMENDER_STAGE_TIMING=1) per-stage model latency, served on /metrics
+metrics = Metrics()
+metrics.describe('http_request_seconds', 'Request latency by endpoint')
+metrics.describe('recommender_rebuild_seconds', 'Duration of background model rebuilds')
+metrics.describe('recommender_stage_seconds', 'Duration of model stages')
+stage_metrics = metrics if os.environ.get('RECOMMENDER_STAGE_TIMING') == '1' else None
+
+# SQLite store, seeded once from the legacy CSV files
+DATABASE_FILE = os.environ.get('RECOMMENDER_DB', 'recommender.db')
 USERS_FILE = 'users.csv'
-if os.path.exists(USERS_FILE):
-    users_df = pd.read_csv(USERS_FILE)
+store = RecommenderStore(DATABASE_FILE)
+if store.is_empty():
+    store.import_csv('movies_data.csv', 'user_ratings.csv', USERS_FILE if os.path.exists(USERS_FILE) else None)
+users = UserIndex(store)
+
+# Most users accepted by one /api/recommend/batch request
+MAX_BATCH_USERS = 1000
+
+# Latent factors of the matrix factorization strategy (opt-in; 0 disables it)
+N_FACTORS = int(os.environ.get('RECOMMENDER_FACTORS', 0))
+
+# With SHARED_MODEL_DIR set (multi-worker deployments), every worker maps the
+# same published model file instead of building its own copy; shared_model.py
+# republishes it when the store changes. Otherwise new ratings are coalesced
+# into model snapshots rebuilt in a background thread.
+SHARED_MODEL_DIR = os.environ.get('SHARED_MODEL_DIR')
+if SHARED_MODEL_DIR:
+    # On a cold start only the first worker builds; the others wait and map its model
+    publish_if_missing(lambda: MovieRecommender(store=store, cache_size=0, n_factors=N_FACTORS), SHARED_MODEL_DIR)
+    shared_model = SharedModel(SHARED_MODEL_DIR, store=store, metrics=stage_metrics)
+    scheduler = None
 else:
-    users_df = pd.DataFrame(columns=['user_id', 'username', 'password', 'email'])
-    users_df.to_csv(USERS_FILE, index=False)
+    shared_model = None
+    # Start from the on-disk snapshot when it is up to date with the store
+    MODEL_SNAPSHOT = os.environ.get('MODEL_SNAPSHOT', 'model.snapshot')
+    scheduler = RebuildScheduler(
+        # Rebuilds start from the served model's factors instead of retraining, and
+        # replace the snapshot so a restart loads the latest model
+        lambda previous: MovieRecommender.build_and_save(
+            MODEL_SNAPSHOT, store=store, n_factors=N_FACTORS, metrics=stage_metrics, warm_start=previous
+        ),
+        debounce=float(os.environ.get('REBUILD_DEBOUNCE', 1.0)),
+        max_delay=float(os.environ.get('REBUILD_MAX_DELAY', 10.0)),
+        initial=MovieRecommender.load_or_build(
+            MODEL_SNAPSHOT, store=store, n_factors=N_FACTORS, metrics=stage_metrics
+        ),
+        metrics=metrics
+    )
+
+# Shared secret for the admin endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.environ.get('RECOMMENDER_ADMIN_TOKEN')
+
+# Optional offline results from precompute.py, served from a read-only memory map
+RECOMMENDATIONS_FILE = os.environ.get('RECOMMENDATIONS_FILE')
+precomputed = PrecomputedRecommendations(RECOMMENDATIONS_FILE) if RECOMMENDATIONS_FILE else None
+
+
+def get_recommender():
+    """The current model snapshot (the latest published one in shared-model mode)"""
+    if shared_model is not None:
+        return shared_model.get()
+    return scheduler.current()
+
+
+def precomputed_recommendations(method, user_id, n):
+    """Precomputed results for a user, or None to fall back to the live model"""
+    # Users who rated since the file was built are served live; the store
+    # tracks this, so every worker process agrees
+    if precomputed is None or store.user_revision(user_id) > precomputed.revision:
+        return None
+    return precomputed.recommend(method, user_id, n)
+
+
+def rating_method():
+    """The ?method= of a recommendation request ('neighbourhood' or 'factorization')"""
+    return request.args.get('method', default='neighbourhood')
+
+
+def recommendation_filters():
+    """Repeated ?genre= (all required) and ?exclude= movie ids of a recommendation request"""
+    return request.args.getlist('genre'), request.args.getlist('exclude', type=int)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe('http_request_seconds', time.perf_counter() - started,
+                        endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    values = {}
+    for key, value in get_recommender().cache_stats().items():
+        kind = 'gauge' if key == 'size' else 'counter'
+        name = f'recommender_cache_{key}' if kind == 'gauge' else f'recommender_cache_{key}_total'
+        values[name] = (kind, f'Recommendation cache {key}', value)
+    if scheduler is not None:
+        stats = scheduler.stats()
+        values['recommender_snapshot_staleness_seconds'] = (
+            'gauge', 'Age of the oldest rating not yet in the served model', stats['staleness_seconds'])
+        values['recommender_snapshot_pending_ratings'] = (
+            'gauge', 'Ratings not yet in the served model', stats['pending_ratings'])
+        values['recommender_snapshot_age_seconds'] = (
+            'gauge', 'Time since the served model was swapped in', stats['snapshot_age_seconds'])
+        values['recommender_rebuild_failures_total'] = (
+            'counter', 'Failed background model rebuilds', stats['failures'])
+    else:
+        values['recommender_shared_model_generation'] = (
+            'gauge', 'Generation of the mapped shared model', shared_model.generation)
+    return Response(metrics.render(values), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/')
@@ -30,13 +150,10 @@ def login():
         username = data.get('username')
         password = data.get('password')
         
-        global users_df
-        users_df = pd.read_csv(USERS_FILE)
-        
-        user = users_df[(users_df['username'] == username) & (users_df['password'] == password)]
+        user = users.authenticate(username, password)
         
-        if not user.empty:
-            session['user_id'] = int(user.iloc[0]['user_id'])
+        if user is not None:
+            session['user_id'] = int(user['user_id'])
             session['username'] = username
             return jsonify({'success': True, 'message': 'Login successful'})
         else:
@@ -53,23 +170,13 @@ def signup():
         password = data.get('password')
         email = data.get('email')
         
-        global users_df
-        users_df = pd.read_csv(USERS_FILE)
+        if not username or not password:
+            return jsonify({'success': False, 'message': 'Username and password are required'}), 400
         
-        if username in users_df['username'].values:
+        new_user_id = users.create(username, password, email)
+        if new_user_id is None:
             return jsonify({'success': False, 'message': 'Username already exists'}), 400
         
-        new_user_id = users_df['user_id'].max() + 1 if not users_df.empty else 1
-        new_user = pd.DataFrame([{
-            'user_id': new_user_id,
-            'username': username,
-            'password': password,
-            'email': email
-        }])
-        
-        users_df = pd.concat([users_df, new_user], ignore_index=True)
-        users_df.to_csv(USERS_FILE, index=False)
-        
         session['user_id'] = int(new_user_id)
         session['username'] = username
         
@@ -88,7 +195,7 @@ def logout():
 def get_users():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-    users = recommender.ratings['user_id'].unique().tolist()
+    users = get_recommender().user_movie_matrix.rated_user_ids().tolist()
     return jsonify(users)
 
 
@@ -112,15 +219,54 @@ def debug_session():
     })
 
 
+@app.route('/api/debug/cache')
+def debug_cache():
+    return jsonify(get_recommender().cache_stats())
+
+
+@app.route('/api/debug/model')
+def debug_model():
+    if scheduler is None:
+        return jsonify({'generation': shared_model.generation})
+    return jsonify(scheduler.stats())
+
+
+# Catalogue encoded once per model snapshot (and gzipped once on first use)
+catalogue_payload = CataloguePayload()
+
+
 @app.route('/api/movies')
 def get_movies():
+    """The whole catalogue, or one page of it with ?limit= (and ?cursor= from the previous page)"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-    movies = recommender.movies.to_dict('records')
-    # Convert int64 to int for JSON serialization
-    for movie in movies:
+    recommender = get_recommender()
+    limit = page_limit()
+    if limit is None:
+        return json_response(catalogue_payload.full(recommender))
+    
+    payload = catalogue_payload.page(recommender, request.args.get('cursor', type=int), limit)
+    if payload is None:
+        return jsonify({'error': 'Unknown cursor'}), 400
+    return json_response(payload)
+
+
+@app.route('/api/search')
+def search_movies():
+    """Movies by title prefix (?q=) and genres (repeated ?genre=, all required)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    query = request.args.get('q', default='')
+    limit = page_limit() or 20
+    movies = get_recommender().search_movies(query, request.args.getlist('genre'), limit)
+    
+    if isinstance(movies, str):
+        return jsonify({'error': movies}), 404
+    
+    result = movies.to_dict('records')
+    for movie in result:
         movie['movie_id'] = int(movie['movie_id'])
-    return jsonify(movies)
+    return jsonify(result)
 
 
 @app.route('/api/rate_movie', methods=['POST'])
@@ -146,33 +292,18 @@ def rate_movie():
         if rating < 1 or rating > 5:
             return jsonify({'success': False, 'error': 'Rating must be between 1 and 5'}), 400
         
-        # Load current ratings
-        ratings_df = pd.read_csv('user_ratings.csv')
-        
-        # Check if user already rated this movie
-        existing = ratings_df[(ratings_df['user_id'] == user_id) & (ratings_df['movie_id'] == movie_id)]
+        if isinstance(get_recommender().get_movie_info(movie_id), str):
+            return jsonify({'success': False, 'error': 'Movie not found'}), 404
         
-        if not existing.empty:
-            # Update existing rating
-            print(f"Updating existing rating")
-            ratings_df.loc[(ratings_df['user_id'] == user_id) & (ratings_df['movie_id'] == movie_id), 'rating'] = rating
-        else:
-            # Add new rating
-            print(f"Adding new rating")
-            new_rating = pd.DataFrame([{
-                'user_id': user_id,
-                'movie_id': movie_id,
-                'rating': rating
-            }])
-            ratings_df = pd.concat([ratings_df, new_rating], ignore_index=True)
+        # Insert or update the rating in the database
+        store.upsert_rating(user_id, movie_id, rating)
+        print("Rating saved to database")
         
-        # Save to CSV
-        ratings_df.to_csv('user_ratings.csv', index=False)
-        print("Rating saved to CSV")
-        
-        # Reload recommender data
-        recommender._load_data()
-        print("Recommender data reloaded")
+        # The next model snapshot picks the rating up (rebuilt in the
+        # background, or republished by shared_model.py)
+        if scheduler is not None:
+            scheduler.submit(user_id, movie_id, rating)
+            print("Rating queued for the next model snapshot")
         
         return jsonify({'success': True, 'message': 'Rating saved successfully!'})
     
@@ -183,11 +314,61 @@ def rate_movie():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def ingest_ratings(frame):
+    """Validate a batch of ratings, store the valid rows in one write and queue one model update"""
+    if len(frame) > MAX_BATCH_ROWS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BATCH_ROWS} ratings per request'}), 413
+    
+    started = time.perf_counter()
+    ratings, rejected = validate_ratings(frame, get_recommender().movie_ids)
+    rows = [tuple(row) for row in ratings.to_numpy().tolist()]
+    if rows:
+        store.upsert_ratings(rows)
+        # One arrival for the scheduler, so the whole batch lands in one rebuild
+        if scheduler is not None:
+            scheduler.submit_many(rows)
+    seconds = time.perf_counter() - started
+    
+    status = 200 if rows or not rejected else 400
+    return jsonify({
+        'success': status == 200,
+        'accepted': len(rows),
+        'rejected_count': len(rejected),
+        'rejected': [{'index': index, 'error': error} for index, error in rejected[:MAX_REPORTED_ERRORS]],
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(len(rows) / seconds) if seconds > 0 else 0
+    }), status
+
+
+@app.route('/api/rate_movies', methods=['POST'])
+def rate_movies():
+    """Rate many movies at once: {"ratings": [{"movie_id": 1, "rating": 4}, ...]} or [[1, 4], ...]"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    frame = ratings_frame(request_items(request.get_json(silent=True)), ('movie_id', 'rating'))
+    if frame is None:
+        return jsonify({'success': False, 'error': 'ratings must be a list of (movie_id, rating) pairs'}), 400
+    frame.insert(0, 'user_id', session['user_id'])
+    return ingest_ratings(frame)
+
+
+@app.route('/api/admin/rate_movies', methods=['POST'])
+def admin_rate_movies():
+    """Bulk import for many users: {"ratings": [{"user_id": 1, "movie_id": 2, "rating": 4}, ...]}"""
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    frame = ratings_frame(request_items(request.get_json(silent=True)), ('user_id', 'movie_id', 'rating'))
+    if frame is None:
+        return jsonify({'success': False, 'error': 'ratings must be a list of (user_id, movie_id, rating) rows'}), 400
+    return ingest_ratings(frame)
+
+
 @app.route('/api/user/<int:user_id>/ratings')
 def get_user_ratings(user_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-    ratings = recommender.get_user_ratings(user_id)
+    ratings = get_recommender().get_user_ratings(user_id, store.user_ratings(user_id))
     return jsonify(ratings)
 
 
@@ -195,8 +376,19 @@ def get_user_ratings(user_id):
 def get_my_ratings():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-    ratings = recommender.get_user_ratings(session['user_id'])
-    return jsonify(ratings)
+    # Read from the store, so a rating shows up before the next model rebuild
+    user_id = session['user_id']
+    current = store.user_ratings(user_id)
+    limit = page_limit()
+    if limit is None:
+        ratings = get_recommender().get_user_ratings(user_id, current)
+        return json_response(EncodedJSON.from_object(ratings))
+    
+    page = get_recommender().get_user_ratings_page(user_id, request.args.get('cursor', type=int), limit, current)
+    if isinstance(page, str):
+        return jsonify({'error': page}), 404
+    ratings, next_cursor = page
+    return json_response(EncodedJSON.from_object({'ratings': ratings, 'next_cursor': next_cursor}))
 
 
 @app.route('/api/recommend/collaborative/<int:user_id>')
@@ -204,7 +396,16 @@ def collaborative_recommend(user_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     n = request.args.get('n', default=5, type=int)
-    recommendations = recommender.collaborative_filtering(user_id, n)
+    method = rating_method()
+    if method not in RATING_METHODS:
+        return jsonify({'error': 'method must be neighbourhood or factorization'}), 400
+    
+    if method == 'factorization':
+        recommendations = get_recommender().matrix_factorization(user_id, n)
+    else:
+        recommendations = precomputed_recommendations('collaborative', user_id, n)
+        if recommendations is None:
+            recommendations = get_recommender().collaborative_filtering(user_id, n)
     
     if isinstance(recommendations, str):
         return jsonify({'error': recommendations}), 404
@@ -228,13 +429,23 @@ def my_recommendations():
     
     user_id = session['user_id']
     n = request.args.get('n', default=5, type=int)
+    method = rating_method()
+    if method not in RATING_METHODS:
+        return jsonify({'error': 'method must be neighbourhood or factorization'}), 400
     
     # Check if user has ratings
-    user_ratings = recommender.get_user_ratings(user_id)
+    user_ratings = get_recommender().get_user_ratings(user_id)
     if isinstance(user_ratings, str) or len(user_ratings) == 0:
         return jsonify({'error': 'Please rate some movies first to get recommendations'}), 404
     
-    recommendations = recommender.hybrid_recommendation(user_id, n)
+    genres, exclude = recommendation_filters()
+    recommendations = None
+    if method == 'neighbourhood' and not genres and not exclude:
+        recommendations = precomputed_recommendations('hybrid', user_id, n)
+    if recommendations is None:
+        recommendations = get_recommender().hybrid_recommendation(
+            user_id, n, method=method, genres=genres, exclude=exclude
+        )
     
     if isinstance(recommendations, str):
         return jsonify({'error': recommendations}), 404
@@ -256,7 +467,12 @@ def content_recommend(movie_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     n = request.args.get('n', default=5, type=int)
-    recommendations = recommender.content_based_filtering(movie_id, n)
+    genres, exclude = recommendation_filters()
+    if precomputed is not None and not genres and not exclude:
+        result = precomputed.similar_movies(movie_id, n)
+        if result is not None:
+            return jsonify(result)
+    recommendations = get_recommender().content_based_filtering(movie_id, n, genres=genres, exclude=exclude)
     
     if isinstance(recommendations, str):
         return jsonify({'error': recommendations}), 404
@@ -273,7 +489,17 @@ def hybrid_recommend(user_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     n = request.args.get('n', default=5, type=int)
-    recommendations = recommender.hybrid_recommendation(user_id, n)
+    method = rating_method()
+    if method not in RATING_METHODS:
+        return jsonify({'error': 'method must be neighbourhood or factorization'}), 400
+    genres, exclude = recommendation_filters()
+    recommendations = None
+    if method == 'neighbourhood' and not genres and not exclude:
+        recommendations = precomputed_recommendations('hybrid', user_id, n)
+    if recommendations is None:
+        recommendations = get_recommender().hybrid_recommendation(
+            user_id, n, method=method, genres=genres, exclude=exclude
+        )
     
     if isinstance(recommendations, str):
         return jsonify({'error': recommendations}), 404
@@ -290,5 +516,45 @@ def hybrid_recommend(user_id):
     return jsonify(result)
 
 
+@app.route('/api/recommend/batch', methods=['POST'])
+def batch_recommend():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    user_ids = data.get('user_ids')
+    n = data.get('n', 5)
+    method = data.get('method', 'collaborative')
+    
+    if not isinstance(user_ids, list) or not all(isinstance(u, int) and not isinstance(u, bool) for u in user_ids):
+        return jsonify({'error': 'user_ids must be a list of integers'}), 400
+    if len(user_ids) > MAX_BATCH_USERS:
+        return jsonify({'error': f'At most {MAX_BATCH_USERS} user_ids per request'}), 413
+    if not isinstance(n, int) or isinstance(n, bool) or n < 1:
+        return jsonify({'error': 'n must be a positive integer'}), 400
+    if method not in BATCH_METHODS:
+        return jsonify({'error': f"method must be one of {', '.join(BATCH_METHODS)}"}), 400
+    
+    recommendations = get_recommender().batch_recommendations(user_ids, n, method)
+    
+    result = {}
+    for user_id, recs in recommendations.items():
+        if isinstance(recs, str):
+            result[str(user_id)] = {'error': recs}
+            continue
+        result[str(user_id)] = [
+            {
+                'movie_id': movie_id,
+                'title': title,
+                'genres': genres,
+                'score': score
+            }
+            for movie_id, title, genres, score in recs
+        ]
+    return jsonify(result)
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
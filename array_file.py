@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy as np
+
+MAGIC = b'TMRARR01'
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_arrays(path, arrays, meta=None):
+    """Write named NumPy arrays into one binary file that can be memory-mapped.
+
+    Layout: 8-byte magic, 8-byte little-endian header length, a JSON header
+    (array dtypes, shapes and offsets plus free-form ``meta``), then every
+    array's raw bytes at a 64-byte aligned offset. The file is written to a
+    temporary name and renamed into place, so readers never see a partial
+    file.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise ValueError(f"Array {name!r} has object dtype; use fixed-width strings")
+
+    # Offsets depend on the header size, which depends on the offsets: size the
+    # header generously first, then lay the arrays out after it
+    layout = {
+        name: {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': 0}
+        for name, array in arrays.items()
+    }
+    header = {'meta': meta or {}, 'arrays': layout}
+    header_size = _aligned(len(MAGIC) + 8 + len(json.dumps(header)) + 32 * len(arrays) + 64)
+    offset = header_size
+    for name, array in arrays.items():
+        layout[name]['offset'] = offset
+        offset = _aligned(offset + array.nbytes)
+    encoded = json.dumps(header).encode('utf-8')
+    if len(MAGIC) + 8 + len(encoded) > header_size:
+        raise ValueError("Array file header does not fit its reserved space")
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, 'little'))
+        f.write(encoded)
+        for name, array in arrays.items():
+            f.seek(layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(max(offset, header_size))
+    os.replace(tmp_path, path)
+
+
+def read_arrays(path, mmap=True):
+    """Open a file written by write_arrays; returns (arrays, meta).
+
+    With ``mmap`` the arrays are read-only views of one shared memory map,
+    so opening is O(1) and pages are shared by every process mapping the
+    same file. A truncated or malformed file raises ValueError.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an array file")
+        header_length = int.from_bytes(f.read(8), 'little')
+        encoded = f.read(header_length)
+    try:
+        if len(encoded) != header_length:
+            raise ValueError("header is truncated")
+        header = json.loads(encoded.decode('utf-8'))
+        meta, specs = header['meta'], header['arrays']
+        specs = {
+            name: (np.dtype(spec['dtype']), tuple(int(d) for d in spec['shape']), int(spec['offset']))
+            for name, spec in specs.items()
+        }
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise ValueError(f"{path} has a malformed array file header: {e}") from None
+
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+
+    arrays = {}
+    for name, (dtype, shape, offset) in specs.items():
+        nbytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        if offset < 0 or offset + nbytes > len(buffer):
+            raise ValueError(f"{path} is truncated: array {name!r} ends past the end of the file")
+        raw = buffer[offset:offset + nbytes]
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=raw)
+    return arrays, meta
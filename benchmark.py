@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from metrics import Metrics
+from recommendation_system import MovieRecommender
+from storage import RecommenderStore
+
+
+def generate(directory, users=10000, movies=2000, density=0.01, genres=20, seed=0):
+    """Write synthetic movies_data.csv and user_ratings.csv; returns both paths.
+
+    Movie popularity is long-tailed (a few movies get most ratings), every
+    movie has one to three of ``genres`` genres and ratings are 1-5.
+    """
+    rng = np.random.default_rng(seed)
+    genre_names = np.array([f'Genre{i}' for i in range(genres)])
+    movie_genres = [
+        '|'.join(rng.choice(genre_names, rng.integers(1, min(3, genres) + 1), replace=False))
+        for _ in range(movies)
+    ]
+    movies_file = os.path.join(directory, 'movies_data.csv')
+    pd.DataFrame({
+        'movie_id': np.arange(1, movies + 1),
+        'title': [f'Movie {i}' for i in range(1, movies + 1)],
+        'genres': movie_genres,
+    }).to_csv(movies_file, index=False)
+
+    n_ratings = max(1, int(users * movies * density))
+    popularity = 1.0 / (np.arange(movies) + 10.0)
+    ratings_file = os.path.join(directory, 'user_ratings.csv')
+    pd.DataFrame({
+        'user_id': rng.integers(1, users + 1, n_ratings),
+        'movie_id': rng.choice(np.arange(1, movies + 1), n_ratings, p=popularity / popularity.sum()),
+        'rating': rng.integers(1, 6, n_ratings),
+    }).to_csv(ratings_file, index=False)
+    return movies_file, ratings_file
+
+
+def latency_summary(samples):
+    """Latency percentiles (milliseconds) of a list of durations in seconds"""
+    ms = np.asarray(samples) * 1000
+    return {
+        'n': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def bench_load(movies_file, ratings_file):
+    """Build time and peak traced memory of a model loaded from the CSV files"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    recommender = MovieRecommender(movies_file, ratings_file, cache_size=0, metrics=Metrics())
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return recommender, {
+        'seconds': round(seconds, 3),
+        'peak_traced_mb': round(peak / 2 ** 20, 1),
+        'users': len(recommender.user_movie_matrix.user_ids),
+        'movies': len(recommender.movie_ids),
+        'ratings': recommender.user_movie_matrix.nnz,
+    }
+
+
+def bench_methods(recommender, queries=500, seed=0):
+    """Per-call latency of the recommender methods on random users and movies (cache off)"""
+    rng = np.random.default_rng(seed)
+    user_ids = rng.choice(recommender.user_movie_matrix.rated_user_ids(), queries).tolist()
+    movie_ids = rng.choice(recommender.movie_ids, queries).tolist()
+    calls = {
+        'collaborative_filtering': (recommender.collaborative_filtering, user_ids),
+        'content_based_filtering': (recommender.content_based_filtering, movie_ids),
+        'hybrid_recommendation': (recommender.hybrid_recommendation, user_ids),
+        'get_user_ratings': (recommender.get_user_ratings, user_ids),
+    }
+    results = {}
+    for name, (method, ids) in calls.items():
+        samples = []
+        for item_id in ids:
+            started = time.perf_counter()
+            method(item_id)
+            samples.append(time.perf_counter() - started)
+        results[name] = latency_summary(samples)
+    return results
+
+
+def stage_breakdown(recommender):
+    """Mean milliseconds per call of every timed model stage (build and serving)"""
+    summary = recommender.metrics.summary('recommender_stage_seconds')
+    return {
+        dict(labels)['stage']: {'calls': stats['count'], 'mean_ms': round(stats['mean'] * 1000, 3)}
+        for labels, stats in sorted(summary.items())
+    }
+
+
+def bench_endpoints(directory, movies_file, ratings_file, requests=500, seed=0):
+    """Throughput and latency of the Flask endpoints through the test client.
+
+    The app is imported against a fresh store seeded from the synthetic
+    files, so this has to run in a process that has not imported app yet.
+    """
+    db_file = os.path.join(directory, 'benchmark.db')
+    RecommenderStore(db_file).import_csv(movies_file, ratings_file, None)
+    os.environ['RECOMMENDER_DB'] = db_file
+    os.environ['MODEL_SNAPSHOT'] = os.path.join(directory, 'benchmark.snapshot')
+    import app
+
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'benchmark'
+
+    rng = np.random.default_rng(seed)
+    recommender = app.get_recommender()
+    user_ids = rng.choice(recommender.user_movie_matrix.rated_user_ids(), requests).tolist()
+    movie_ids = rng.choice(recommender.movie_ids, requests).tolist()
+    routes = {
+        '/api/recommend/collaborative/<user_id>': ['/api/recommend/collaborative/%d' % u for u in user_ids],
+        '/api/recommend/hybrid/<user_id>': ['/api/recommend/hybrid/%d' % u for u in user_ids],
+        '/api/recommend/content/<movie_id>': ['/api/recommend/content/%d' % m for m in movie_ids],
+        '/api/user/<user_id>/ratings': ['/api/user/%d/ratings' % u for u in user_ids],
+    }
+    results = {}
+    for route, urls in routes.items():
+        samples = []
+        started = time.perf_counter()
+        for url in urls:
+            request_started = time.perf_counter()
+            client.get(url)
+            samples.append(time.perf_counter() - request_started)
+        seconds = time.perf_counter() - started
+        results[route] = dict(latency_summary(samples), requests_per_second=round(len(urls) / seconds, 1))
+    return results
+
+
+def run(users=10000, movies=2000, density=0.01, genres=20, queries=500, requests=500, seed=0,
+        endpoints=True, directory=None):
+    """Generate a dataset, run every benchmark and return the results as a dict"""
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = directory or tmp
+        started = time.perf_counter()
+        movies_file, ratings_file = generate(directory, users, movies, density, genres, seed)
+        generate_seconds = time.perf_counter() - started
+
+        recommender, load = bench_load(movies_file, ratings_file)
+        results = {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'params': {'users': users, 'movies': movies, 'density': density, 'genres': genres,
+                       'queries': queries, 'requests': requests, 'seed': seed},
+            'generate_seconds': round(generate_seconds, 3),
+            'load': load,
+            'methods': bench_methods(recommender, queries, seed),
+        }
+        results['stages'] = stage_breakdown(recommender)
+        if endpoints:
+            results['endpoints'] = bench_endpoints(directory, movies_file, ratings_file, requests, seed)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the recommender on synthetic data')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--density', type=float, default=0.01, help='fraction of user/movie pairs rated')
+    parser.add_argument('--genres', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=500, help='calls per recommender method')
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-endpoints', action='store_true', help='skip the Flask endpoint benchmark')
+    parser.add_argument('--data-dir', default=None, help='keep the generated files here')
+    parser.add_argument('--output', default=None, help='write the JSON results to this file')
+    args = parser.parse_args()
+
+    results = run(args.users, args.movies, args.density, args.genres, args.queries, args.requests,
+                  args.seed, not args.no_endpoints, args.data_dir)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
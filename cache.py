@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class RecommendationCache:
+    """Bounded LRU cache with a TTL and tag-based invalidation.
+
+    Every entry can be stored with a set of dependency tags (for example
+    ('user', 3) or 'catalogue'); invalidating a tag evicts exactly the
+    entries that depend on it. Counters track hits, misses, evictions
+    (capacity and expiry) and invalidations.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tagged = defaultdict(set)  # tag -> keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tagged[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tag):
+        """Evict every entry that depends on ``tag``"""
+        with self._lock:
+            for key in list(self._tagged.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def inherit(self, other, drop_tags=()):
+        """Copy the live entries of ``other`` (and its counters), except those tagged with ``drop_tags``
+
+        Meant for a cache that is not shared yet: a new model snapshot takes
+        over the previous snapshot's warm entries minus the invalidated ones,
+        and later writes to ``other`` never reach this cache.
+        """
+        drop_tags = set(drop_tags)
+        with other._lock:
+            entries = list(other._entries.items())
+            counters = (other.hits, other.misses, other.evictions, other.invalidations)
+        now = time.monotonic()
+        with self._lock:
+            self.hits, self.misses, self.evictions, self.invalidations = counters
+            for key, (expires_at, value, tags) in entries[-self.max_entries:]:
+                if tags & drop_tags:
+                    self.invalidations += 1
+                elif expires_at >= now:
+                    self._entries[key] = (expires_at, value, tags)
+                    for tag in tags:
+                        self._tagged[tag].add(key)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tagged.clear()
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tagged[tag]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,91 @@
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from ranking import top_k_rows, top_n
+
+# Movie columns used as content features when present in the catalogue
+DEFAULT_FEATURES = ('genres', 'cast', 'director', 'year')
+
+
+class ContentIndex:
+    """Top-K most similar movies for every movie, by content features.
+
+    Each feature column is one-hot encoded ('|' separates multiple values,
+    years are bucketed by decade) and rows are L2-normalized, so similarity
+    is cosine. Only the K best neighbours of every movie are kept, as
+    compact (movies x K) arrays of catalogue positions and scores.
+    """
+
+    def __init__(self, movies, features=DEFAULT_FEATURES, top_k=50, chunk_size=1024):
+        self.features = [f for f in features if f in movies.columns]
+        self.chunk_size = chunk_size
+        self.feature_matrix = self._build_features(movies)
+        self.top_k = max(0, min(top_k, len(movies) - 1))
+        self.neighbours, self.scores = self._build_neighbours()
+
+    @classmethod
+    def from_arrays(cls, features, feature_matrix, neighbours, scores, chunk_size=1024):
+        """Attach a prebuilt feature matrix and neighbour table"""
+        index = cls.__new__(cls)
+        index.features = list(features)
+        index.chunk_size = chunk_size
+        index.feature_matrix = feature_matrix
+        index.top_k = neighbours.shape[1]
+        index.neighbours = neighbours
+        index.scores = scores
+        return index
+
+    def _build_features(self, movies):
+        blocks = []
+        for feature in self.features:
+            values = movies[feature]
+            if feature == 'year':
+                years = values.fillna(0).astype(int)
+                values = (years // 10 * 10).astype(str) + 's'
+            cv = CountVectorizer(tokenizer=lambda x: x.split('|'), token_pattern=None, binary=True)
+            blocks.append(cv.fit_transform(values.fillna('').astype(str)))
+        if not blocks:
+            return sparse.csr_matrix((len(movies), 0), dtype=np.float64)
+
+        features = sparse.hstack(blocks, format='csr', dtype=np.float64)
+        norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).ravel())
+        inverse = np.zeros_like(norms)
+        np.divide(1.0, norms, out=inverse, where=norms > 0)
+        return sparse.csr_matrix(sparse.diags(inverse) @ features)
+
+    def _build_neighbours(self):
+        n_movies, k = self.feature_matrix.shape[0], self.top_k
+        neighbours = np.zeros((n_movies, k), dtype=np.int32)
+        scores = np.zeros((n_movies, k), dtype=np.float32)
+        if k == 0:
+            return neighbours, scores
+
+        features_t = self.feature_matrix.T.tocsc()
+        for start in range(0, n_movies, self.chunk_size):
+            end = min(start + self.chunk_size, n_movies)
+            block = (self.feature_matrix[start:end] @ features_t).toarray()
+            block[np.arange(end - start), np.arange(start, end)] = -np.inf
+            neighbours[start:end], scores[start:end] = top_k_rows(block, k)
+        return neighbours, scores
+
+    def similar(self, position, n, mask=None):
+        """Catalogue positions and scores of the n movies most similar to ``position``
+
+        With a boolean ``mask`` over the catalogue only movies where it is
+        True are considered.
+        """
+        neighbours, scores = self.neighbours[position], self.scores[position]
+        if mask is not None:
+            keep = mask[neighbours]
+            neighbours, scores = neighbours[keep], scores[keep]
+        if n <= len(neighbours):
+            return neighbours[:n], scores[:n]
+
+        # Not enough kept neighbours: score this one movie against the catalogue
+        row = np.asarray((self.feature_matrix @ self.feature_matrix[position].T).todense()).ravel()
+        row[position] = np.nan
+        if mask is not None:
+            row[~mask] = np.nan
+        top = top_n(row, n)
+        return top, row[top]
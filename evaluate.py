@@ -0,0 +1,208 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark import latency_summary
+from ingest import CHUNK_ROWS, read_rating_chunks
+from recommendation_system import MovieRecommender
+
+STRATEGIES = ('collaborative', 'hybrid', 'factorization', 'content')
+
+# Model loaded once per worker process by the pool initializer
+_worker_recommender = None
+
+
+def holdout_mask(user_ids, movie_ids, fraction, seed=0):
+    """Deterministic test-set membership of (user, movie) pairs.
+
+    A hash of the pair decides, so a pair lands in the same split in every
+    chunk and every run with the same seed, without holding the data.
+    """
+    keys = (user_ids.astype(np.uint64) << np.uint64(32)) | movie_ids.astype(np.uint32).astype(np.uint64)
+    # splitmix64 finalizer
+    with np.errstate(over='ignore'):
+        h = keys + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        h = h ^ (h >> np.uint64(31))
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53) < fraction
+
+
+def split_ratings(ratings_file, train_file, fraction=0.2, seed=0, chunk_size=CHUNK_ROWS):
+    """Stream a ratings CSV into a training CSV and return the held-out ratings.
+
+    Only the held-out part is kept in memory, as compact arrays; repeated
+    (user, movie) pairs keep their last rating as in training.
+    """
+    test = []
+    header = True
+    for chunk in read_rating_chunks(ratings_file, chunk_size):
+        held_out = holdout_mask(chunk['user_id'].to_numpy(), chunk['movie_id'].to_numpy(), fraction, seed)
+        chunk[~held_out].to_csv(train_file, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        test.append(chunk[held_out])
+    test = pd.concat(test, ignore_index=True) if test else pd.DataFrame(columns=['user_id', 'movie_id', 'rating'])
+    return test.drop_duplicates(subset=['user_id', 'movie_id'], keep='last')
+
+
+def ranking_metrics(recommended, relevant, k):
+    """Precision@k, recall@k and binary-relevance NDCG@k of one ranked list"""
+    hits = np.isin(np.asarray(recommended[:k]), relevant)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(len(relevant), k)].sum()
+    return (
+        hits.sum() / k,
+        hits.sum() / len(relevant),
+        (discounts[:len(hits)] * hits).sum() / ideal if ideal > 0 else 0.0
+    )
+
+
+def _recommend(recommender, strategy, user_id, k):
+    """Ranked movie ids of one strategy for a user, or None if it has no answer"""
+    if strategy == 'collaborative':
+        result = recommender.collaborative_filtering(user_id, k)
+    elif strategy == 'hybrid':
+        result = recommender.hybrid_recommendation(user_id, k)
+    elif strategy == 'factorization':
+        result = recommender.matrix_factorization(user_id, k)
+    else:
+        # Movies like the user's favourite training movie, minus what they rated
+        matrix = recommender.user_movie_matrix
+        cols, ratings = matrix.user_row(matrix.user_index[user_id])
+        rated = recommender.movie_ids[cols]
+        seed = int(rated[np.argmax(ratings)])
+        result = recommender.content_based_filtering(seed, k, exclude=rated.tolist())
+        return None if isinstance(result, str) else result['movie_id'].tolist()
+    return None if isinstance(result, str) else [movie_id for movie_id, _, _, _ in result]
+
+
+def _init_worker(snapshot_file):
+    global _worker_recommender
+    _worker_recommender = MovieRecommender.load(snapshot_file, cache_size=0)
+
+
+def _evaluate_chunk(args):
+    user_ids, relevant, strategies, k = args
+    recommender = _worker_recommender
+    results = {}
+    for strategy in strategies:
+        metrics = np.zeros((len(user_ids), 3))
+        latencies = np.zeros(len(user_ids), dtype=np.float32)
+        answered = np.zeros(len(user_ids), dtype=bool)
+        for i, (user_id, movies) in enumerate(zip(user_ids, relevant)):
+            started = time.perf_counter()
+            recommended = _recommend(recommender, strategy, user_id, k)
+            latencies[i] = time.perf_counter() - started
+            if recommended is not None:
+                answered[i] = True
+                metrics[i] = ranking_metrics(recommended, movies, k)
+        results[strategy] = (metrics.sum(axis=0), int(answered.sum()), latencies)
+    return results
+
+
+def evaluate(movies_file='movies_data.csv', ratings_file='user_ratings.csv', k=10, test_fraction=0.2,
+             threshold=4, max_users=None, strategies=STRATEGIES, processes=None, chunk_size=256,
+             n_factors=32, seed=0):
+    """Hold out ratings, build one model on the rest and score every strategy on held-out hits.
+
+    The training model is saved as a snapshot that every worker maps
+    instead of building its own, so memory stays at about one model
+    however many processes run. Held-out ratings of at least
+    ``threshold`` are the relevant movies of a user.
+    """
+    strategies = [s for s in strategies if s != 'factorization' or n_factors]
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        train_file = os.path.join(tmp, 'train.csv')
+        test = split_ratings(ratings_file, train_file, test_fraction, seed)
+        split_seconds = time.perf_counter() - started
+
+        build_started = time.perf_counter()
+        recommender = MovieRecommender(movies_file, train_file, cache_size=0, n_factors=n_factors or None)
+        build_seconds = time.perf_counter() - build_started
+        snapshot_file = os.path.join(tmp, 'train.snapshot')
+        recommender.save(snapshot_file, sources={})
+
+        # Users with relevant held-out movies that training knows about
+        relevant = test[test['rating'] >= threshold]
+        relevant = relevant[relevant['user_id'].isin(recommender.user_movie_matrix.rated_user_ids())]
+        groups = relevant.groupby('user_id')['movie_id']
+        user_ids = np.asarray(list(groups.groups))
+        if max_users is not None and len(user_ids) > max_users:
+            user_ids = np.sort(np.random.default_rng(seed).choice(user_ids, max_users, replace=False))
+        movies_by_user = groups.apply(lambda movies: movies.to_numpy())
+        del recommender
+
+        chunks = [
+            (user_ids[start:start + chunk_size].tolist(),
+             movies_by_user.loc[user_ids[start:start + chunk_size]].tolist(), strategies, k)
+            for start in range(0, len(user_ids), chunk_size)
+        ]
+        totals = {s: [np.zeros(3), 0, []] for s in strategies}
+        eval_started = time.perf_counter()
+        with multiprocessing.Pool(processes, _init_worker, (snapshot_file,)) as pool:
+            for results in pool.imap_unordered(_evaluate_chunk, chunks):
+                for strategy, (sums, answered, latencies) in results.items():
+                    totals[strategy][0] += sums
+                    totals[strategy][1] += answered
+                    totals[strategy][2].append(latencies)
+        eval_seconds = time.perf_counter() - eval_started
+
+    report = {}
+    for strategy, (sums, answered, latencies) in totals.items():
+        latencies = np.concatenate(latencies) if latencies else np.zeros(0)
+        precision, recall, ndcg = sums / len(user_ids) if len(user_ids) else sums
+        report[strategy] = {
+            f'precision@{k}': round(float(precision), 4),
+            f'recall@{k}': round(float(recall), 4),
+            f'ndcg@{k}': round(float(ndcg), 4),
+            'answered_users': answered,
+            'latency': latency_summary(latencies) if len(latencies) else {},
+            'users_per_second_per_process': round(len(latencies) / float(latencies.sum()), 1)
+            if latencies.sum() > 0 else 0,
+        }
+    return {
+        'params': {'k': k, 'test_fraction': test_fraction, 'threshold': threshold, 'max_users': max_users,
+                   'processes': processes or os.cpu_count(), 'n_factors': n_factors, 'seed': seed},
+        'test_ratings': len(test),
+        'users': len(user_ids),
+        'split_seconds': round(split_seconds, 3),
+        'build_seconds': round(build_seconds, 3),
+        'evaluate_seconds': round(eval_seconds, 3),
+        'strategies': report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline hold-out evaluation of the recommendation strategies')
+    parser.add_argument('--movies', default='movies_data.csv')
+    parser.add_argument('--ratings', default='user_ratings.csv')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--test-fraction', type=float, default=0.2, help='share of ratings held out')
+    parser.add_argument('--threshold', type=int, default=4, help='lowest held-out rating counted as relevant')
+    parser.add_argument('--max-users', type=int, default=None, help='evaluate a random sample of users')
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=256, help='users per worker task')
+    parser.add_argument('--factors', type=int, default=32, help='latent factors (0 skips factorization)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='write the JSON results to this file')
+    args = parser.parse_args()
+
+    results = evaluate(args.movies, args.ratings, args.k, args.test_fraction, args.threshold, args.max_users,
+                       args.strategies, args.processes, args.chunk_size, args.factors, args.seed)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import numpy as np
+
+from ranking import top_n
+
+# Padded ratings gathered per stacked solve (bounds its temporary arrays)
+SOLVE_BATCH = 8192
+
+
+class FactorModel:
+    """Latent-factor model of the ratings trained with alternating least squares.
+
+    A rating is predicted as ``mean + user_factors[u] @ item_factors[m]``, so
+    scoring every movie for one user is a single (movies x k) mat-vec.
+    Each ALS half-step solves one small k x k system per user (or movie)
+    with the other side's factors fixed. New ratings are folded in by
+    re-solving only that user's factors against the current item factors.
+    """
+
+    def __init__(self, n_factors=32, regularization=0.1, n_iter=10, seed=0):
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.n_iter = n_iter
+        self.seed = seed
+        self.mean = 0.0
+        self.user_factors = None
+        self.item_factors = None
+
+    @classmethod
+    def from_arrays(cls, params, mean, user_factors, item_factors):
+        """Attach trained factors from exported (possibly read-only) arrays"""
+        model = cls(**params)
+        model.mean = mean
+        model.user_factors = user_factors
+        model.item_factors = item_factors
+        return model
+
+    def warm_started(self, user_rows, item_rows):
+        """A copy starting from these factors, re-indexed to a new rating matrix.
+
+        ``user_rows``/``item_rows`` give the row of every new user/movie in
+        this model, or -1 for users and movies it has not seen (they start
+        at zero and get their factors from the first half-step).
+        """
+        model = type(self)(**self.params())
+        model.mean = self.mean
+        model.user_factors = self._reindex(self.user_factors, user_rows)
+        model.item_factors = self._reindex(self.item_factors, item_rows)
+        return model
+
+    def _reindex(self, factors, rows):
+        rows = np.asarray(rows)
+        known = (rows >= 0) & (rows < len(factors))
+        reindexed = np.zeros((len(rows), self.n_factors))
+        reindexed[known] = factors[rows[known]]
+        return reindexed
+
+    def params(self):
+        return {
+            'n_factors': self.n_factors,
+            'regularization': self.regularization,
+            'n_iter': self.n_iter,
+            'seed': self.seed,
+        }
+
+    def fit(self, ratings):
+        """Train on a (users x movies) CSR matrix of ratings (0 = not rated)"""
+        rng = np.random.default_rng(self.seed)
+        n_users, n_movies = ratings.shape
+        self.user_factors = rng.normal(0, 0.1, (n_users, self.n_factors))
+        self.item_factors = rng.normal(0, 0.1, (n_movies, self.n_factors))
+        self.partial_fit(ratings, self.n_iter)
+
+    def partial_fit(self, ratings, n_iter=1):
+        """Run more ALS sweeps starting from the current factors"""
+        self.mean = float(ratings.data.mean()) if ratings.nnz else 0.0
+        by_movie = ratings.T.tocsr()
+        for _ in range(n_iter):
+            self.user_factors = self._solve(ratings, self.item_factors)
+            self.item_factors = self._solve(by_movie, self.user_factors)
+        self.user_factors = self.user_factors.astype(np.float32)
+        self.item_factors = self.item_factors.astype(np.float32)
+
+    def _solve(self, ratings, fixed):
+        """Least-squares factors of every row of ``ratings`` given the other side's factors.
+
+        Rows are sorted by rating count and solved a chunk at a time: each
+        chunk's rated factors are gathered into one (rows x width x k)
+        array padded with a zero factor row, so its Gram matrices and
+        solves are single stacked NumPy calls.
+        """
+        # Row len(fixed) is all zeros: padding slots point at it and add nothing
+        fixed = np.vstack([fixed.astype(np.float64), np.zeros((1, self.n_factors))])
+        factors = np.zeros((ratings.shape[0], self.n_factors))
+        counts = np.diff(ratings.indptr)
+        rows = np.flatnonzero(counts)
+        rows = rows[np.argsort(counts[rows], kind='stable')]
+        start = 0
+        while start < len(rows):
+            # Sorted counts: the chunk's last row sets the padded width
+            guess = min(start + max(1, SOLVE_BATCH // counts[rows[start]]), len(rows))
+            end = min(start + max(1, SOLVE_BATCH // counts[rows[guess - 1]]), len(rows))
+            chunk = rows[start:end]
+            factors[chunk] = self._solve_rows(ratings, chunk, counts[chunk], fixed)
+            start = end
+        return factors
+
+    def _solve_rows(self, ratings, rows, counts, fixed):
+        offsets = np.arange(counts.max())
+        valid = offsets < counts[:, None]
+        entries = np.where(valid, ratings.indptr[rows][:, None] + offsets, 0)
+        rated = fixed[np.where(valid, ratings.indices[entries], len(fixed) - 1)]
+        values = np.where(valid, ratings.data[entries] - self.mean, 0.0)
+        # Regularization scaled by the number of ratings (weighted-lambda ALS)
+        gram = rated.transpose(0, 2, 1) @ rated
+        gram += self.regularization * counts[:, None, None] * np.eye(self.n_factors)
+        rhs = (rated.transpose(0, 2, 1) @ values[..., None])[..., 0]
+        return np.linalg.solve(gram, rhs[..., None])[..., 0]
+
+    def _solve_row(self, fixed, values, identity):
+        # Regularization scaled by the number of ratings (weighted-lambda ALS)
+        gram = fixed.T @ fixed + identity * len(values)
+        return np.linalg.solve(gram, fixed.T @ (values - self.mean))
+
+    def update_user(self, row, cols, values):
+        """Fold one user's current ratings into their factors (item factors unchanged)"""
+        if row >= len(self.user_factors):
+            missing = row + 1 - len(self.user_factors)
+            self.user_factors = np.vstack([
+                self.user_factors, np.zeros((missing, self.n_factors), dtype=self.user_factors.dtype)
+            ])
+        if len(cols) == 0:
+            self.user_factors[row] = 0
+            return
+        identity = self.regularization * np.eye(self.n_factors)
+        fixed = self.item_factors[cols].astype(np.float64)
+        self.user_factors[row] = self._solve_row(fixed, values.astype(np.float64), identity)
+
+    def scores(self, row):
+        """Predicted rating of every movie for one user row"""
+        return self.item_factors @ self.user_factors[row] + self.mean
+
+    def recommend(self, row, n, exclude=None):
+        """Top-n movie columns and predicted ratings, skipping the ``exclude`` columns"""
+        scores = self.scores(row).astype(np.float64)
+        if exclude is not None:
+            scores[exclude] = np.nan
+        top = top_n(scores, n)
+        return top, scores[top]
@@ -0,0 +1,44 @@
+import numpy as np
+from scipy import sparse
+
+
+class GenreIndex:
+    """Genre vocabulary with a sparse movie x genre indicator matrix.
+
+    Built once from the catalogue's '|'-separated genre strings, so genre
+    overlaps between many movies are sparse matrix products rather than
+    per-movie string splitting.
+    """
+
+    def __init__(self, genres):
+        tokens = genres.reset_index(drop=True).fillna('').astype(str).str.split('|').explode()
+        tokens = tokens[tokens != '']
+        rows = tokens.index.to_numpy()
+        self.vocabulary, cols = np.unique(tokens.to_numpy().astype(str), return_inverse=True)
+        self.genre_ids = {genre: i for i, genre in enumerate(self.vocabulary)}
+
+        indicator = sparse.csr_matrix(
+            (np.ones(len(cols), dtype=np.float32), (rows, cols)),
+            shape=(len(genres), len(self.vocabulary))
+        )
+        indicator.sum_duplicates()
+        indicator.data[:] = 1  # a genre listed twice still counts once
+        self.indicator = indicator
+
+    @classmethod
+    def from_arrays(cls, vocabulary, indicator):
+        """Attach a prebuilt vocabulary and indicator matrix"""
+        index = cls.__new__(cls)
+        index.vocabulary = vocabulary
+        index.genre_ids = {str(genre): i for i, genre in enumerate(vocabulary)}
+        index.indicator = indicator
+        return index
+
+    def profile(self, positions):
+        """How many of the given movies carry each genre"""
+        counts = self.indicator[positions].sum(axis=0)
+        return np.asarray(counts, dtype=np.float64).ravel()
+
+    def overlap(self, positions, profile):
+        """Shared genre counts of each movie in ``positions`` summed over a profile"""
+        return np.asarray(self.indicator[positions] @ profile).ravel()
@@ -0,0 +1,64 @@
+import argparse
+import resource
+import time
+
+import pandas as pd
+
+from rating_matrix import RATING_DTYPES, RatingMatrix
+
+CHUNK_ROWS = 1_000_000
+
+
+def read_rating_chunks(path, chunk_size=CHUNK_ROWS):
+    """Read a ratings CSV in chunks with compact dtypes (int32 ids, int8 ratings)"""
+    return pd.read_csv(
+        path,
+        usecols=list(RATING_DTYPES),
+        dtype=RATING_DTYPES,
+        chunksize=chunk_size
+    )
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_matrix(ratings_file, movie_ids, chunk_size=CHUNK_ROWS, backend='auto'):
+    """Stream a ratings CSV into a RatingMatrix; returns (matrix, stats)"""
+    started = time.time()
+    rows = 0
+
+    def counted(chunks):
+        nonlocal rows
+        for chunk in chunks:
+            rows += len(chunk)
+            yield chunk
+
+    matrix = RatingMatrix.from_chunks(counted(read_rating_chunks(ratings_file, chunk_size)), movie_ids, backend)
+    seconds = time.time() - started
+    return matrix, {
+        'rows': rows,
+        'ratings': matrix.nnz,
+        'users': len(matrix.user_ids),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds > 0 else 0,
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a ratings dump into the sparse rating matrix')
+    parser.add_argument('--ratings', default='user_ratings.csv')
+    parser.add_argument('--movies', default='movies_data.csv')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    movie_ids = pd.read_csv(args.movies, usecols=['movie_id'])['movie_id'].to_numpy()
+    _, stats = load_matrix(args.ratings, movie_ids, args.chunk_size, backend='sparse')
+    print(f"Read {stats['rows']} rows ({stats['ratings']} distinct ratings, {stats['users']} users) "
+          f"in {stats['seconds']}s: {stats['rows_per_second']} rows/s, peak RSS {stats['peak_rss_mb']} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import threading
+import time
+from contextlib import nullcontext
+
+# Histogram bucket upper bounds in seconds (fine-grained below 1ms for model stages)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# Shared no-op context used when timing is disabled
+NOT_TIMED = nullcontext()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+class Metrics:
+    """Thread-safe latency histograms rendered in the Prometheus text format.
+
+    Histograms are keyed by metric name and label values and created on
+    first observation; every histogram keeps cumulative bucket counts, a
+    sum and a count, as Prometheus expects.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.help = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = histogram[0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def timer(self, name, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, name, labels)
+
+    def summary(self, name):
+        """Count, sum and mean of every histogram of ``name``, by label set"""
+        with self._lock:
+            return {
+                labels: {'count': count, 'sum': total, 'mean': total / count if count else 0.0}
+                for (metric, labels), (_, total, count) in self._histograms.items() if metric == name
+            }
+
+    def render(self, values=None):
+        """All histograms as Prometheus text, plus ``values``: name -> (type, help, value)
+
+        ``values`` holds point-in-time gauges and counters read at scrape time.
+        """
+        with self._lock:
+            snapshot = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+
+        lines = []
+        for name in sorted({name for name, _ in snapshot}):
+            if name in self.help:
+                lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), (counts, total, count) in sorted(snapshot.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_labels(labels, le=repr(bound))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+                lines.append(f'{name}_sum{_labels(labels)} {total}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+
+        for name, (kind, text, value) in sorted((values or {}).items()):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
@@ -0,0 +1,217 @@
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from ranking import top_n
+
+
+def _dense(values):
+    return values.toarray() if sparse.issparse(values) else np.asarray(values)
+
+
+class ExactSearch:
+    """Brute-force neighbour search: every user is a candidate"""
+
+    name = 'exact'
+
+    def fit(self, normalized):
+        pass
+
+    def candidates(self, query, n_users):
+        """Candidate user rows for a normalized query row (None = all users)"""
+        return None
+
+    def params(self):
+        return {}
+
+    def to_arrays(self):
+        return {}
+
+
+class IVFSearch:
+    """Inverted-file index over the normalized user rows.
+
+    Users are clustered with spherical k-means; a query only scores the
+    users of the ``n_probe`` clusters whose centroids are closest to it.
+    ``n_probe`` is the recall/latency knob: probing more clusters scores
+    more candidates and finds more of the exact neighbours. Users added
+    after fit() are always scored until the next fit.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, n_clusters=None, n_probe=8, n_iter=10, seed=0, chunk_size=4096):
+        self.n_clusters = n_clusters
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.centroids = None
+        self.order = None
+        self.offsets = None
+
+    @classmethod
+    def from_arrays(cls, params, centroids, order, offsets):
+        """Attach a fitted index from exported (possibly read-only) arrays"""
+        search = cls(**params)
+        search.centroids = centroids
+        search.order = order
+        search.offsets = offsets
+        return search
+
+    def fit(self, normalized):
+        n_users = normalized.shape[0]
+        n_clusters = self.n_clusters or int(np.sqrt(n_users))
+        n_clusters = max(1, min(n_clusters, n_users))
+        if n_users == 0:
+            self.centroids = np.zeros((0, normalized.shape[1]), dtype=np.float32)
+            self.order = np.zeros(0, dtype=np.int32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            return
+
+        rng = np.random.default_rng(self.seed)
+        norms = np.asarray(abs(normalized).sum(axis=1)).ravel()
+        seeds = np.flatnonzero(norms > 0)
+        if len(seeds) < n_clusters:
+            seeds = np.arange(n_users)
+        initial = np.sort(rng.choice(seeds, n_clusters, replace=False))
+        centroids = _dense(normalized[initial]).astype(np.float32)
+
+        for _ in range(self.n_iter):
+            assignment = self._assign(normalized, centroids)
+            members = sparse.csr_matrix(
+                (np.ones(n_users, dtype=np.float32), (assignment, np.arange(n_users))),
+                shape=(n_clusters, n_users)
+            )
+            sums = _dense(members @ normalized)
+            lengths = np.linalg.norm(sums, axis=1)
+            # Empty clusters keep their previous centroid
+            filled = lengths > 0
+            centroids[filled] = sums[filled] / lengths[filled, None]
+
+        assignment = self._assign(normalized, centroids)
+        self.centroids = centroids
+        self.order = np.argsort(assignment, kind='stable').astype(np.int32)
+        self.offsets = np.searchsorted(assignment[self.order], np.arange(n_clusters + 1)).astype(np.int64)
+
+    def _assign(self, normalized, centroids):
+        """Index of the closest centroid for every user row, in chunks"""
+        n_users = normalized.shape[0]
+        assignment = np.empty(n_users, dtype=np.int32)
+        for start in range(0, n_users, self.chunk_size):
+            end = min(start + self.chunk_size, n_users)
+            assignment[start:end] = _dense(normalized[start:end] @ centroids.T).argmax(axis=1)
+        return assignment
+
+    def candidates(self, query, n_users):
+        n_clusters = len(self.centroids)
+        if self.n_probe >= n_clusters:
+            return None
+        probe = top_n(self.centroids @ query, self.n_probe)
+        parts = [self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe]
+        parts.append(np.arange(len(self.order), n_users, dtype=np.int32))
+        # Sorted so ties between candidates resolve by lower row, as in the exact scan
+        return np.sort(np.concatenate(parts))
+
+    def params(self):
+        return {
+            'n_clusters': self.n_clusters,
+            'n_probe': self.n_probe,
+            'n_iter': self.n_iter,
+            'seed': self.seed,
+        }
+
+    def to_arrays(self):
+        return {'centroids': self.centroids, 'order': self.order, 'offsets': self.offsets}
+
+
+SEARCH_BACKENDS = {'exact': ExactSearch, 'ivf': IVFSearch}
+
+
+def make_search(search):
+    """A neighbour search backend from a name ('exact', 'ivf') or an instance"""
+    if isinstance(search, str):
+        if search not in SEARCH_BACKENDS:
+            raise ValueError(f"Unknown neighbour search backend: {search}")
+        return SEARCH_BACKENDS[search]()
+    return search
+
+
+def recall_report(similarity, searches, k=3, sample=1000, seed=0):
+    """Recall@k and mean query latency of approximate backends against exact search.
+
+    ``similarity`` is a fitted UserSimilarity and ``searches`` maps a label
+    to a search backend; each backend is fitted on the same normalized rows
+    and queried for a random sample of users. Returns one dict per label.
+    """
+    normalized = similarity.normalized
+    n_users = normalized.shape[0]
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(n_users, min(sample, n_users), replace=False)
+
+    exact = ExactSearch()
+    started = time.perf_counter()
+    truth = [set(similarity.search_neighbours(row, k, exact)[0].tolist()) for row in rows]
+    exact_ms = (time.perf_counter() - started) * 1000 / len(rows)
+
+    report = [{'search': 'exact', 'recall': 1.0, 'candidates': float(n_users),
+               'query_ms': round(exact_ms, 3), 'fit_seconds': 0.0}]
+    for label, search in searches.items():
+        started = time.perf_counter()
+        search.fit(normalized)
+        fit_seconds = time.perf_counter() - started
+
+        hits = total = 0
+        started = time.perf_counter()
+        for row, expected in zip(rows, truth):
+            found, _ = similarity.search_neighbours(row, k, search)
+            hits += len(expected.intersection(found.tolist()))
+            total += len(expected)
+        query_ms = (time.perf_counter() - started) * 1000 / len(rows)
+
+        scanned = 0
+        for row in rows:
+            candidates = search.candidates(_dense(normalized[row]).ravel(), n_users)
+            scanned += n_users if candidates is None else len(candidates)
+
+        report.append({
+            'search': label,
+            'recall': round(hits / total, 4) if total else 1.0,
+            'candidates': round(scanned / len(rows), 1),
+            'query_ms': round(query_ms, 3),
+            'fit_seconds': round(fit_seconds, 3),
+        })
+    return report
+
+
+def main():
+    # Imported here so the search backends do not depend on the recommender
+    from recommendation_system import MovieRecommender
+    from storage import RecommenderStore
+
+    parser = argparse.ArgumentParser(description='Recall/latency report of approximate neighbour search')
+    parser.add_argument('--clusters', type=int, default=None, help='IVF clusters (default sqrt(users))')
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--sample', type=int, default=1000)
+    parser.add_argument('--movies', default='movies_data.csv')
+    parser.add_argument('--ratings', default='user_ratings.csv')
+    parser.add_argument('--db', default=None, help='read from this SQLite store instead of the CSV files')
+    args = parser.parse_args()
+
+    store = RecommenderStore(args.db) if args.db else None
+    recommender = MovieRecommender(args.movies, args.ratings, store=store, cache_size=0)
+    searches = {
+        f'ivf n_probe={n_probe}': IVFSearch(n_clusters=args.clusters, n_probe=n_probe)
+        for n_probe in args.probes
+    }
+    print(f"{'search':<20} {'recall@' + str(args.k):>9} {'candidates':>11} {'query ms':>9} {'fit s':>7}")
+    for row in recall_report(recommender.user_similarity, searches, args.k, args.sample):
+        print(f"{row['search']:<20} {row['recall']:>9.4f} {row['candidates']:>11.1f} "
+              f"{row['query_ms']:>9.3f} {row['fit_seconds']:>7.3f}")
+
+
+if __name__ == '__main__':
+    main()
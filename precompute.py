@@ -0,0 +1,182 @@
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from array_file import read_arrays, write_arrays
+from recommendation_system import BATCH_METHODS, MovieRecommender
+from storage import RecommenderStore
+
+FORMAT_VERSION = 1
+
+# Model built once per worker process by the pool initializer
+_worker_recommender = None
+
+
+def _build_recommender(movies_file, ratings_file, db_file):
+    store = RecommenderStore(db_file) if db_file else None
+    return MovieRecommender(movies_file, ratings_file, store=store, cache_size=0)
+
+
+def _init_worker(movies_file, ratings_file, db_file):
+    global _worker_recommender
+    _worker_recommender = _build_recommender(movies_file, ratings_file, db_file)
+
+
+def _score_chunk(args):
+    start, user_ids, n = args
+    recommender = _worker_recommender
+    rows = np.array([recommender.user_movie_matrix.user_index[u] for u in user_ids], dtype=np.int64)
+    results = []
+    for method in BATCH_METHODS:
+        positions, scores = recommender.batch_top_n(rows, n, method)
+        results.append(_pad(positions, scores, n))
+    return start, results
+
+
+def _pad(positions, scores, n):
+    """Pad (rows x k) results to exactly n columns with -1 / NaN"""
+    padded_positions = np.full((positions.shape[0], n), -1, dtype=np.int32)
+    padded_scores = np.full((positions.shape[0], n), np.nan, dtype=np.float32)
+    padded_positions[:, :positions.shape[1]] = positions
+    padded_scores[:, :scores.shape[1]] = scores
+    return padded_positions, padded_scores
+
+
+def precompute(output, n=20, processes=None, chunk_size=256,
+               movies_file='movies_data.csv', ratings_file='user_ratings.csv', db_file=None):
+    """Write top-N collaborative, hybrid and content results for the whole catalogue
+
+    With a store the file records the store revision it was built at, so a
+    server can tell which users rated something since.
+    """
+    started = time.time()
+    # Taken before building, so ratings added meanwhile count as newer
+    revision = RecommenderStore(db_file).revision() if db_file else None
+    recommender = _build_recommender(movies_file, ratings_file, db_file)
+    user_ids = np.sort(recommender.user_movie_matrix.rated_user_ids())
+    n_movies = len(recommender.movie_ids)
+
+    arrays = {
+        'user_ids': user_ids,
+        'catalogue_ids': recommender.movie_ids.astype(np.int64),
+        'catalogue_order': np.argsort(recommender.movie_ids, kind='stable'),
+        'titles': recommender.movie_titles.astype(str),
+        'genres': recommender.movie_genres.astype(str),
+    }
+    for method in BATCH_METHODS:
+        arrays[f'{method}_positions'] = np.full((len(user_ids), n), -1, dtype=np.int32)
+        arrays[f'{method}_scores'] = np.full((len(user_ids), n), np.nan, dtype=np.float32)
+
+    # Collaborative and hybrid results: user chunks fanned out over a pool
+    chunks = [
+        (start, user_ids[start:start + chunk_size].tolist(), n)
+        for start in range(0, len(user_ids), chunk_size)
+    ]
+    with multiprocessing.Pool(processes, _init_worker, (movies_file, ratings_file, db_file)) as pool:
+        for start, results in pool.imap_unordered(_score_chunk, chunks):
+            for method, (positions, scores) in zip(BATCH_METHODS, results):
+                end = start + len(positions)
+                arrays[f'{method}_positions'][start:end] = positions
+                arrays[f'{method}_scores'][start:end] = scores
+
+    # Content results come straight from the precomputed neighbour index
+    content_positions = np.full((n_movies, n), -1, dtype=np.int32)
+    content_scores = np.full((n_movies, n), np.nan, dtype=np.float32)
+    for position in range(n_movies):
+        neighbours, scores = recommender.content_index.similar(position, n)
+        content_positions[position, :len(neighbours)] = neighbours
+        content_scores[position, :len(scores)] = scores
+    arrays['content_positions'] = content_positions
+    arrays['content_scores'] = content_scores
+
+    meta = {'version': FORMAT_VERSION, 'n': n, 'created': time.time(), 'revision': revision}
+    write_arrays(output, arrays, meta)
+    return {
+        'users': len(user_ids),
+        'movies': n_movies,
+        'seconds': round(time.time() - started, 3)
+    }
+
+
+class PrecomputedRecommendations:
+    """Read-only, memory-mapped view of a file written by precompute()"""
+
+    def __init__(self, path):
+        self.path = path
+        self.arrays, self.meta = read_arrays(path)
+        if self.meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported precomputed file version: {self.meta.get('version')}")
+        self.n = self.meta['n']
+        # Store revision the results were computed at (0: built from CSV files)
+        self.revision = self.meta.get('revision') or 0
+
+    @staticmethod
+    def _offset(ids, value, order=None):
+        """Row offset of ``value`` in a sorted id array (or sorted through ``order``)"""
+        keys = ids if order is None else ids[order]
+        pos = int(np.searchsorted(keys, value))
+        if pos == len(keys) or keys[pos] != value:
+            return None
+        return pos if order is None else int(order[pos])
+
+    def recommend(self, method, user_id, n_recommendations=5):
+        """Precomputed (movie_id, title, genres, score) tuples, or None if not available"""
+        if method not in BATCH_METHODS or n_recommendations > self.n:
+            return None
+        # Hybrid re-ranks the best 2 x N predictions, so a shorter list is not
+        # a prefix of the stored one: only the file's own N matches the live answer
+        if method == 'hybrid' and n_recommendations != self.n:
+            return None
+        row = self._offset(self.arrays['user_ids'], user_id)
+        if row is None:
+            return None
+        positions = self.arrays[f'{method}_positions'][row, :n_recommendations]
+        scores = self.arrays[f'{method}_scores'][row, :n_recommendations]
+        valid = positions >= 0
+        positions, scores = positions[valid], scores[valid].astype(np.float64)
+        return list(zip(
+            self.arrays['catalogue_ids'][positions].tolist(),
+            self.arrays['titles'][positions].tolist(),
+            self.arrays['genres'][positions].tolist(),
+            np.round(scores, 2).tolist()
+        ))
+
+    def similar_movies(self, movie_id, n_recommendations=5):
+        """Precomputed content results as a list of movie dicts, or None if not available"""
+        if n_recommendations > self.n:
+            return None
+        row = self._offset(self.arrays['catalogue_ids'], movie_id, self.arrays['catalogue_order'])
+        if row is None:
+            return None
+        positions = self.arrays['content_positions'][row, :n_recommendations]
+        positions = positions[positions >= 0]
+        return [
+            {'movie_id': movie_id, 'title': title, 'genres': genres}
+            for movie_id, title, genres in zip(
+                self.arrays['catalogue_ids'][positions].tolist(),
+                self.arrays['titles'][positions].tolist(),
+                self.arrays['genres'][positions].tolist()
+            )
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute recommendations for every user and movie')
+    parser.add_argument('--output', default='recommendations.bin')
+    parser.add_argument('--n', type=int, default=20, help='recommendations stored per user/movie')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--movies', default='movies_data.csv')
+    parser.add_argument('--ratings', default='user_ratings.csv')
+    parser.add_argument('--db', default=None, help='read from this SQLite store instead of the CSV files')
+    args = parser.parse_args()
+
+    stats = precompute(args.output, args.n, args.processes, args.chunk_size,
+                       args.movies, args.ratings, args.db)
+    print(f"Wrote {args.output}: {stats['users']} users, {stats['movies']} movies in {stats['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def top_n(scores, n):
+    """Indices of the n highest non-NaN scores, best first (ties by lower index)"""
+    valid = np.flatnonzero(~np.isnan(scores))
+    if n <= 0 or len(valid) == 0:
+        return valid[:0]
+    if n < len(valid):
+        # Keep everything tied with the n-th best so ties resolve by index
+        threshold = np.partition(scores[valid], len(valid) - n)[len(valid) - n]
+        valid = valid[scores[valid] >= threshold]
+    return valid[np.lexsort((valid, -scores[valid]))][:n]
+
+
+def top_k_rows(block, k):
+    """Column indices and scores of the k highest scores in every row of ``block``.
+
+    Rows are ordered best first with ties resolved by lower column index,
+    matching a stable descending sort of each row.
+    """
+    n_rows, n_cols = block.shape
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.zeros((n_rows, 0), dtype=np.int64), np.zeros((n_rows, 0), dtype=block.dtype)
+
+    top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(block, top, axis=1)
+
+    # argpartition picks arbitrarily among scores tied with the k-th best. In
+    # those rows keep the picks above the tie and refill the remaining slots
+    # with the lowest-index tied columns, for all rows at once
+    threshold = top_scores.min(axis=1)
+    above = top_scores > threshold[:, None]
+    at = block == threshold[:, None]
+    padded = np.isnan(threshold)
+    if padded.any():
+        # NaN never compares equal, so rows padded with NaN tie on NaN instead
+        above[padded] = ~np.isnan(top_scores[padded])
+        at[padded] = np.isnan(block[padded])
+    n_above = above.sum(axis=1)
+    tied = np.flatnonzero(n_above + at.sum(axis=1) > k)
+    if len(tied):
+        # Picks above the tie first, in any order; the final sort fixes it
+        kept = n_above[tied]
+        first = np.argsort(~above[tied], axis=1, kind='stable')
+        top[tied] = np.take_along_axis(top[tied], first, axis=1)
+        rows, cols = np.nonzero(at[tied])
+        # Rank of every tied column within its row (nonzero is row-major)
+        starts = np.searchsorted(rows, np.arange(len(tied)))
+        rank = np.arange(len(rows)) - starts[rows]
+        fill = rank < k - kept[rows]
+        rows, cols, rank = rows[fill], cols[fill], rank[fill]
+        top[tied[rows], kept[rows] + rank] = cols
+        top_scores[tied] = block[tied[:, None], top[tied]]
+
+    order = np.lexsort((top, -top_scores), axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from rating_matrix import RATING_DTYPES
+
+# Largest batch accepted by one bulk rating request
+MAX_BATCH_ROWS = 100_000
+# Rejected rows listed in a response (the count covers all of them)
+MAX_REPORTED_ERRORS = 100
+
+
+def request_items(data):
+    """The rating list of a JSON body: {"ratings": [...]} or a bare list"""
+    return data.get('ratings') if isinstance(data, dict) else data
+
+
+def ratings_frame(items, columns):
+    """DataFrame of a JSON list of rating objects or [value, ...] rows, or None if malformed"""
+    if not isinstance(items, list):
+        return None
+    if items and all(isinstance(item, dict) for item in items):
+        return pd.DataFrame.from_records(items, columns=list(columns))
+    if not all(isinstance(item, list) and len(item) == len(columns) for item in items):
+        return None
+    return pd.DataFrame(items, columns=list(columns))
+
+
+def validate_ratings(frame, movie_ids):
+    """Split a batch into valid rows and (row index, error) pairs, checking whole columns at once.
+
+    Valid rows come back with compact rating dtypes; when a (user, movie)
+    pair repeats, the last one wins.
+    """
+    errors = pd.Series(None, index=pd.RangeIndex(len(frame)), dtype=object)
+
+    def reject(invalid, message):
+        errors[invalid & errors.isna().to_numpy()] = message
+
+    values = {}
+    for column in frame.columns:
+        numbers = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+        reject(np.isnan(numbers) | (numbers != np.round(numbers)), f'Invalid {column}')
+        values[column] = np.nan_to_num(numbers)
+    # Ids must fit the compact int32 columns they are cast to below
+    id_max = np.iinfo(RATING_DTYPES['user_id']).max
+    for column in ('user_id', 'movie_id'):
+        if column in values:
+            reject((values[column] <= 0) | (values[column] > id_max), f'Invalid {column}')
+    reject((values['rating'] < 1) | (values['rating'] > 5), 'Rating must be between 1 and 5')
+    reject(~np.isin(values['movie_id'], movie_ids), 'Movie not found')
+
+    valid = errors.isna().to_numpy()
+    rows = pd.DataFrame({
+        column: values[column][valid].astype(RATING_DTYPES[column]) for column in RATING_DTYPES
+    }).drop_duplicates(subset=['user_id', 'movie_id'], keep='last')
+    rejected = errors[~valid]
+    return rows, list(zip(rejected.index.tolist(), rejected.tolist()))
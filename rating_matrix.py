@@ -0,0 +1,266 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Matrices with at most this many cells use the plain dense backend
+DENSE_MAX_CELLS = 250_000
+
+# Compact dtypes of streamed rating chunks
+RATING_DTYPES = {'user_id': np.int32, 'movie_id': np.int32, 'rating': np.int8}
+
+# Buffered ratings are deduplicated whenever they grow past this many entries
+COMPACT_EVERY = 20_000_000
+
+
+def _latest(keys, ratings):
+    """Sort (user, column) keys, keeping only the last rating of every key"""
+    order = np.argsort(keys, kind='stable')
+    keys, ratings = keys[order], ratings[order]
+    last = np.append(keys[1:] != keys[:-1], True)[:len(keys)]
+    return keys[last], ratings[last]
+
+
+class IdIndex:
+    """Id -> position map backed by NumPy arrays instead of a Python dict.
+
+    Lookups are a binary search over the sorted ids, so the index can live
+    in shared or memory-mapped arrays. Ids added later (new users) go into
+    a small dict overlay. Passing a prebuilt ``order`` and ``sorted_ids``
+    (``ids[order]``) attaches them without sorting or copying.
+    """
+
+    def __init__(self, ids, order=None, sorted_ids=None):
+        self.ids = np.asarray(ids)
+        if order is None and len(self.ids) > 1 and not (self.ids[1:] > self.ids[:-1]).all():
+            order = np.argsort(self.ids, kind='stable')
+        self.order = order
+        if sorted_ids is None:
+            sorted_ids = self.ids if order is None else self.ids[order]
+        self.sorted_ids = sorted_ids
+        self._added = {}
+
+    def get(self, key, default=None):
+        pos = np.searchsorted(self.sorted_ids, key)
+        if pos < len(self.sorted_ids) and self.sorted_ids[pos] == key:
+            return int(pos if self.order is None else self.order[pos])
+        return self._added.get(key, default)
+
+    def __getitem__(self, key):
+        position = self.get(key)
+        if position is None:
+            raise KeyError(key)
+        return position
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.ids) + len(self._added)
+
+    def add(self, key, position):
+        self._added[key] = position
+
+    def positions(self, keys, default=-1):
+        """Positions of many ids at once (``default`` for unknown ids)"""
+        keys = np.asarray(keys)
+        found = np.full(len(keys), default, dtype=np.int64)
+        if len(self.sorted_ids):
+            pos = np.minimum(np.searchsorted(self.sorted_ids, keys), len(self.sorted_ids) - 1)
+            hit = self.sorted_ids[pos] == keys
+            found[hit] = pos[hit] if self.order is None else self.order[pos[hit]]
+        for i in np.flatnonzero(found == default):
+            found[i] = self._added.get(keys[i].item(), default)
+        return found
+
+
+class RatingMatrix:
+    """User x movie rating matrix with integer id <-> row/column mappings.
+
+    Ratings are stored as a scipy CSR matrix (memory proportional to the
+    number of ratings) or, for tiny datasets, as a dense NumPy array.
+    A rating of 0 means "not rated".
+    """
+
+    def __init__(self, user_ids, movie_ids, values, user_order=None, movie_order=None,
+                 user_sorted_ids=None, movie_sorted_ids=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.user_index = IdIndex(self.user_ids, user_order, user_sorted_ids)
+        self.movie_index = IdIndex(self.movie_ids, movie_order, movie_sorted_ids)
+        self.values = values
+
+    @classmethod
+    def from_chunks(cls, chunks, movie_ids, backend='auto'):
+        """Build the matrix from an iterable of rating DataFrames, streaming.
+
+        Each chunk is reduced to int64 (user, column) keys and int8 ratings;
+        the buffer is deduplicated (later ratings win) whenever it grows past
+        COMPACT_EVERY entries, so memory follows the number of distinct
+        ratings rather than the size of the input. The sorted keys then
+        give the CSR arrays directly.
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        movie_index = pd.Index(movie_ids)
+        keys, ratings, buffered = [], [], 0
+        for chunk in chunks:
+            # Ratings of movies outside the catalogue can never be recommended
+            cols = movie_index.get_indexer(chunk['movie_id'].to_numpy())
+            known = cols >= 0
+            users = chunk['user_id'].to_numpy()[known].astype(np.int64)
+            keys.append((users << 32) | cols[known].astype(np.int64))
+            ratings.append(chunk['rating'].to_numpy()[known].astype(np.int8))
+            buffered += len(keys[-1])
+            if buffered > COMPACT_EVERY:
+                merged = _latest(np.concatenate(keys), np.concatenate(ratings))
+                keys, ratings, buffered = [merged[0]], [merged[1]], len(merged[0])
+
+        keys, ratings = _latest(
+            np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64),
+            np.concatenate(ratings) if ratings else np.zeros(0, dtype=np.int8)
+        )
+        users = keys >> 32
+        starts = np.flatnonzero(np.append(True, users[1:] != users[:-1])[:len(users)])
+        user_ids = users[starts]
+        indptr = np.append(starts, len(keys))
+        indptr = indptr.astype(np.int32 if len(keys) <= np.iinfo(np.int32).max else np.int64)
+        values = sparse.csr_matrix(
+            (ratings.astype(np.float32), (keys & 0xFFFFFFFF).astype(np.int32), indptr),
+            shape=(len(user_ids), len(movie_ids))
+        )
+        if cls._use_dense(backend, values.shape):
+            values = values.toarray()
+        return cls(user_ids, movie_ids, values)
+
+    def to_csr(self):
+        """The ratings as a CSR matrix, whichever backend holds them"""
+        if self.is_sparse:
+            return self.values
+        return sparse.csr_matrix(self.values)
+
+    @staticmethod
+    def _use_dense(backend, shape):
+        if backend == 'dense':
+            return True
+        if backend == 'sparse':
+            return False
+        return shape[0] * shape[1] <= DENSE_MAX_CELLS
+
+    @property
+    def is_sparse(self):
+        return sparse.issparse(self.values)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nnz(self):
+        if self.is_sparse:
+            return self.values.nnz
+        return int(np.count_nonzero(self.values))
+
+    def has_user(self, user_id):
+        """Whether the user has at least one rating"""
+        row = self.user_index.get(user_id)
+        return row is not None and len(self.user_row(row)[0]) > 0
+
+    def rated_user_ids(self):
+        """Ids of all users with at least one rating"""
+        if self.is_sparse:
+            counts = np.diff(self.values.indptr)
+        else:
+            counts = np.count_nonzero(self.values, axis=1)
+        return self.user_ids[counts > 0]
+
+    def user_row(self, row):
+        """Column indices and ratings of one user's non-zero entries"""
+        if self.is_sparse:
+            start, end = self.values.indptr[row], self.values.indptr[row + 1]
+            return self.values.indices[start:end], self.values.data[start:end]
+        cols = np.flatnonzero(self.values[row])
+        return cols, self.values[row, cols]
+
+    def get(self, row, col):
+        cols, data = self.user_row(row)
+        pos = np.searchsorted(cols, col)
+        if pos < len(cols) and cols[pos] == col:
+            return float(data[pos])
+        return 0.0
+
+    def row_norms(self):
+        """Euclidean norm of every user's rating vector"""
+        if self.is_sparse:
+            squares = self.values.multiply(self.values).sum(axis=1)
+            return np.sqrt(np.asarray(squares, dtype=np.float64).ravel())
+        return np.sqrt((self.values.astype(np.float64) ** 2).sum(axis=1))
+
+    def set(self, user_id, movie_id, rating):
+        """Insert or update a single rating; returns the user's row index"""
+        col = self.movie_index[movie_id]
+        row = self.user_index.get(user_id)
+        if row is None:
+            row = self._append_user(user_id)
+
+        if not self.is_sparse:
+            self.values[row, col] = rating
+            return row
+
+        m = self.values
+        start, end = m.indptr[row], m.indptr[row + 1]
+        pos = start + np.searchsorted(m.indices[start:end], col)
+        if pos < end and m.indices[pos] == col:
+            m.data[pos] = rating
+        else:
+            indices = np.insert(m.indices, pos, col)
+            data = np.insert(m.data, pos, rating)
+            indptr = m.indptr.copy()
+            indptr[row + 1:] += 1
+            self.values = sparse.csr_matrix((data, indices, indptr), shape=m.shape)
+        return row
+
+    def delete(self, user_id, movie_id):
+        """Remove a single rating; returns the user's row index or None"""
+        row = self.user_index.get(user_id)
+        col = self.movie_index.get(movie_id)
+        if row is None or col is None or self.get(row, col) == 0:
+            return None
+
+        if not self.is_sparse:
+            self.values[row, col] = 0
+            return row
+
+        m = self.values
+        start, end = m.indptr[row], m.indptr[row + 1]
+        pos = start + np.searchsorted(m.indices[start:end], col)
+        indptr = m.indptr.copy()
+        indptr[row + 1:] -= 1
+        self.values = sparse.csr_matrix(
+            (np.delete(m.data, pos), np.delete(m.indices, pos), indptr),
+            shape=m.shape
+        )
+        return row
+
+    def _append_user(self, user_id):
+        row = len(self.user_ids)
+        self.user_ids = np.append(self.user_ids, user_id)
+        self.user_index.add(int(user_id), row)
+        if self.is_sparse:
+            m = self.values
+            indptr = np.append(m.indptr, m.indptr[-1])
+            self.values = sparse.csr_matrix(
+                (m.data, m.indices, indptr),
+                shape=(row + 1, m.shape[1])
+            )
+        else:
+            self.values = np.vstack([self.values, np.zeros((1, self.values.shape[1]), dtype=self.values.dtype)])
+        return row
+
+    def to_frame(self):
+        """Ratings in long format (user_id, movie_id, rating)"""
+        coo = sparse.coo_matrix(self.values)
+        mask = coo.data != 0
+        return pd.DataFrame({
+            'user_id': self.user_ids[coo.row[mask]],
+            'movie_id': self.movie_ids[coo.col[mask]],
+            'rating': coo.data[mask].astype(int)
+        })
@@ -0,0 +1,136 @@
+import threading
+import time
+import traceback
+
+
+class RebuildScheduler:
+    """Serves an immutable model snapshot and rebuilds it in a background thread.
+
+    Request threads call submit() after writing a rating to the store and
+    return immediately. The worker coalesces queued ratings: it waits until
+    no rating arrived for ``debounce`` seconds (but never longer than
+    ``max_delay`` after the first one), builds a complete new snapshot with
+    ``build(previous)`` and swaps it in with one assignment. ``previous`` is
+    the snapshot being replaced, so the build can warm-start from it.
+    Readers hold on to whatever current() returned, so they never see a
+    half-built model. ``initial`` is the first snapshot (e.g. loaded from
+    disk); by default it is built with ``build(None)``. Build durations go to the optional
+    metrics.Metrics as ``recommender_rebuild_seconds``.
+    """
+
+    def __init__(self, build, debounce=1.0, max_delay=10.0, initial=None, metrics=None):
+        self.build = build
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self._snapshot = initial if initial is not None else build(None)
+        self._snapshot_time = time.time()
+        self._condition = threading.Condition()
+        self._pending = []
+        self._in_build = []
+        self._last_submit = 0.0
+        self._flushing = False
+        self._stopping = False
+        self._builds = 0
+        self._failures = 0
+        self._last_build_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def current(self):
+        """The latest complete model snapshot"""
+        return self._snapshot
+
+    def submit(self, user_id, movie_id, rating):
+        """Queue a rating (already stored) for the next snapshot"""
+        self.submit_many([(user_id, movie_id, rating)])
+
+    def submit_many(self, ratings):
+        """Queue a batch of (user_id, movie_id, rating) rows (already stored) as one arrival"""
+        with self._condition:
+            now = time.monotonic()
+            self._pending.extend((now, user_id, movie_id, rating) for user_id, movie_id, rating in ratings)
+            self._last_submit = now
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Build a snapshot with everything queued so far right away and wait for it"""
+        with self._condition:
+            if self._pending:
+                self._flushing = True
+                self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._pending and not self._in_build, timeout)
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopping)
+                if self._stopping:
+                    return
+                # Debounce: let a burst of ratings settle into one rebuild
+                first = self._pending[0][0]
+                while not (self._flushing or self._stopping):
+                    now = time.monotonic()
+                    deadline = min(self._last_submit + self.debounce, first + self.max_delay)
+                    if now >= deadline:
+                        break
+                    self._condition.wait(deadline - now)
+                self._in_build, self._pending = self._pending, []
+                self._flushing = False
+
+            started = time.monotonic()
+            try:
+                snapshot = self.build(self._snapshot)
+            except Exception:
+                traceback.print_exc()
+                with self._condition:
+                    # Keep serving the old snapshot and retry with the next batch
+                    self._pending = self._in_build + self._pending
+                    self._in_build = []
+                    self._failures += 1
+                    self._condition.notify_all()
+                self._stop_wait(self.debounce)
+                continue
+
+            previous = self._snapshot
+            if previous.cache is not None and snapshot.cache is not None:
+                # Copy the warm entries into the new snapshot's own cache before
+                # it is reachable, minus everything the new ratings touched (and
+                # factor results: retraining moves every factor). Requests still
+                # running on the old snapshot only write to the old cache.
+                stale = [('user', user_id) for user_id in {user_id for _, user_id, _, _ in self._in_build}]
+                snapshot.cache.inherit(previous.cache, stale + ['factors'])
+            self._snapshot = snapshot
+
+            if self.metrics is not None:
+                self.metrics.observe('recommender_rebuild_seconds', time.monotonic() - started)
+            with self._condition:
+                self._snapshot_time = time.time()
+                self._last_build_seconds = time.monotonic() - started
+                self._builds += 1
+                self._in_build = []
+                self._condition.notify_all()
+
+    def _stop_wait(self, seconds):
+        with self._condition:
+            self._condition.wait_for(lambda: self._stopping, seconds)
+
+    def stats(self):
+        """Snapshot staleness: queued ratings not visible yet and how long the oldest has waited"""
+        with self._condition:
+            unapplied = self._in_build + self._pending
+            oldest = unapplied[0][0] if unapplied else None
+            return {
+                'pending_ratings': len(unapplied),
+                'staleness_seconds': round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+                'snapshot_age_seconds': round(time.time() - self._snapshot_time, 3),
+                'last_build_seconds': round(self._last_build_seconds, 3),
+                'builds': self._builds,
+                'failures': self._failures,
+            }
@@ -1,148 +1,812 @@
+import os
+
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from scipy import sparse
+
+from array_file import read_arrays, write_arrays
+from cache import RecommendationCache
+from content_index import ContentIndex, DEFAULT_FEATURES
+from factor_model import FactorModel
+from genre_index import GenreIndex
+from ingest import read_rating_chunks
+from metrics import NOT_TIMED
+from neighbour_search import SEARCH_BACKENDS, make_search
+from ranking import top_k_rows, top_n
+from rating_matrix import RatingMatrix
+from search_index import SearchIndex
+from similarity import UserSimilarity
+
+BATCH_METHODS = ('collaborative', 'hybrid')
+# How per-user predicted ratings are computed
+RATING_METHODS = ('neighbourhood', 'factorization')
+
+# Bumped whenever export_arrays() changes what it writes
+SNAPSHOT_VERSION = 1
+# ALS sweeps run when a rebuild starts from the previous model's factors
+WARM_START_SWEEPS = 1
+
+
+def _dense(values):
+    """A sparse or dense matrix product result as a dense NumPy array"""
+    return values.toarray() if sparse.issparse(values) else np.asarray(values)
+
+
+def _source_fingerprint(movies_file, ratings_file, store):
+    """What a snapshot was built from: the store revision, or the CSV sizes and mtimes"""
+    if store is not None:
+        return {'store': os.path.abspath(store.path), 'revision': store.revision()}
+    fingerprint = {}
+    for name, path in (('movies', movies_file), ('ratings', ratings_file)):
+        stat = os.stat(path)
+        fingerprint[name] = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+
+def _snapshot_options(neighbour_table_size, neighbour_search, content_features, content_neighbours, n_factors):
+    """Model options a snapshot must have been built with to be reused"""
+    search = make_search(neighbour_search)
+    return {
+        'neighbour_table_size': neighbour_table_size,
+        'neighbour_search': {'name': search.name, 'params': search.params()},
+        'content_features': list(content_features),
+        'content_neighbours': content_neighbours,
+        'n_factors': n_factors,
+    }
 
 
 class MovieRecommender:
-    def __init__(self, movies_file='movies_data.csv', ratings_file='user_ratings.csv'):
+    def __init__(self, movies_file='movies_data.csv', ratings_file='user_ratings.csv', matrix_backend='auto',
+                 neighbour_table_size=None, content_features=DEFAULT_FEATURES, content_neighbours=50,
+                 store=None, cache_size=10000, cache_ttl=300, neighbour_search='exact', n_factors=None,
+                 metrics=None, warm_start=None):
         self.movies_file = movies_file
         self.ratings_file = ratings_file
+        self.store = store
+        self.matrix_backend = matrix_backend
+        self.neighbour_table_size = neighbour_table_size
+        self.neighbour_search = neighbour_search
+        self.n_factors = n_factors
+        self.content_features = content_features
+        self.content_neighbours = content_neighbours
+        self.cache = RecommendationCache(cache_size, cache_ttl) if cache_size else None
+        # Optional metrics.Metrics receiving per-stage timings
+        self.metrics = metrics
+        # Previous model whose factors seed this one (used once, then dropped)
+        self._warm_start = warm_start
+        self.movies = None
         self._load_data()
     
+    def _timed(self, stage):
+        """Context manager timing one model stage (a shared no-op without metrics)"""
+        if self.metrics is None:
+            return NOT_TIMED
+        return self.metrics.timer('recommender_stage_seconds', stage=stage)
+    
     def _load_data(self):
-        """Load or reload data from CSV files"""
-        self.movies = pd.read_csv(self.movies_file)
-        self.ratings = pd.read_csv(self.ratings_file)
+        """Load or reload data from the store, or from CSV files without one"""
+        if self.store is None and not (self.movies_file and self.ratings_file):
+            raise ValueError("No store or data files to load the model from")
+        previous_movies = self.movies
+        # Ratings are streamed in compact chunks straight into the sparse matrix
+        if self.store is not None:
+            self.movies = self.store.load_movies()
+            rating_chunks = self.store.iter_ratings()
+        else:
+            self.movies = pd.read_csv(self.movies_file)
+            rating_chunks = read_rating_chunks(self.ratings_file)
+        
+        if self.cache is not None:
+            # Content results only depend on the catalogue
+            if previous_movies is not None and self.movies.equals(previous_movies):
+                self.cache.invalidate('ratings')
+            else:
+                self.cache.clear()
         self.user_movie_matrix = None
-        self.content_similarity = None
-        self._prepare_data()
+        self.user_similarity = None
+        self.content_index = None
+        self.genre_index = None
+        self.search_index = None
+        self.factor_model = None
+        self.read_only = False
+        self._prepare_data(rating_chunks)
+    
+    def rebuild(self):
+        """Fully rebuild the model from its data source (maintenance operation)"""
+        self._load_data()
     
-    def _prepare_data(self):
+    def _prepare_data(self, rating_chunks):
+        # movie_id -> catalogue position index and column arrays for bulk lookups
+        self.movie_ids = self.movies['movie_id'].to_numpy()
+        self.movie_titles = self.movies['title'].astype(str).to_numpy()
+        self.movie_genres = self.movies['genres'].astype(str).to_numpy()
+        
         # Create user-movie rating matrix for collaborative filtering
-        self.user_movie_matrix = self.ratings.pivot_table(
-            index='user_id', 
-            columns='movie_id', 
-            values='rating'
-        ).fillna(0)
-        
-        # Calculate content-based similarity
-        cv = CountVectorizer(tokenizer=lambda x: x.split('|'))
-        genre_matrix = cv.fit_transform(self.movies['genres'])
-        self.content_similarity = cosine_similarity(genre_matrix)
-    
-    def collaborative_filtering(self, user_id, n_recommendations=5):
+        # (columns follow catalogue positions)
+        with self._timed('prepare_rating_matrix'):
+            self.user_movie_matrix = RatingMatrix.from_chunks(
+                rating_chunks,
+                self.movie_ids,
+                backend=self.matrix_backend
+            )
+        self.movie_positions = self.user_movie_matrix.movie_index
+        with self._timed('prepare_user_similarity'):
+            self.user_similarity = UserSimilarity(
+                self.user_movie_matrix,
+                top_k=self.neighbour_table_size,
+                search=make_search(self.neighbour_search)
+            )
+        
+        # Optional latent-factor model (matrix factorization strategy)
+        if self.n_factors:
+            with self._timed('prepare_factor_model'):
+                self.factor_model = self._warm_started_factors()
+                if self.factor_model is None:
+                    self.factor_model = FactorModel(self.n_factors)
+                    self.factor_model.fit(self.user_movie_matrix.to_csr())
+                else:
+                    self.factor_model.partial_fit(self.user_movie_matrix.to_csr(), WARM_START_SWEEPS)
+        self._warm_start = None
+        
+        # Genre vocabulary used for hybrid genre boosting
+        with self._timed('prepare_genre_index'):
+            self.genre_index = GenreIndex(self.movies['genres'])
+        
+        # Genre and title-token postings for search and filtered recommendations
+        with self._timed('prepare_search_index'):
+            self.search_index = SearchIndex(self.movie_titles, self.genre_index)
+        
+        # Precompute the top-K content neighbours of every movie
+        with self._timed('prepare_content_index'):
+            self.content_index = ContentIndex(
+                self.movies,
+                features=self.content_features,
+                top_k=self.content_neighbours
+            )
+    
+    def _warm_started_factors(self):
+        """The previous model's factors re-indexed to this rating matrix, or None"""
+        previous = getattr(self._warm_start, 'factor_model', None)
+        if previous is None or previous.n_factors != self.n_factors:
+            return None
+        old, new = self._warm_start.user_movie_matrix, self.user_movie_matrix
+        return previous.warm_started(
+            old.user_index.positions(new.user_ids),
+            old.movie_index.positions(new.movie_ids)
+        )
+    
+    @property
+    def ratings(self):
+        """All ratings in long format (user_id, movie_id, rating)"""
+        return self.user_movie_matrix.to_frame()
+    
+    def export_arrays(self):
+        """The prepared model as flat NumPy arrays plus JSON-serializable metadata
+        
+        Everything needed to serve requests is included (catalogue columns,
+        id maps, CSR buffers, neighbour tables), so from_arrays() can attach
+        to the arrays without recomputing anything.
+        """
+        matrix = self.user_movie_matrix
+        ratings = matrix.to_csr()
+        similarity = self.user_similarity
+        inverse = np.zeros_like(similarity.norms)
+        np.divide(1.0, similarity.norms, out=inverse, where=similarity.norms > 0)
+        features = self.content_index.feature_matrix
+        user_order = np.argsort(matrix.user_ids, kind='stable')
+        movie_order = np.argsort(matrix.movie_ids, kind='stable')
+        
+        arrays = {
+            'user_ids': matrix.user_ids,
+            'user_order': user_order,
+            'user_sorted_ids': matrix.user_ids[user_order],
+            'movie_order': movie_order,
+            'movie_sorted_ids': matrix.movie_ids[movie_order],
+            'rating_data': ratings.data,
+            'rating_indices': ratings.indices,
+            'rating_indptr': ratings.indptr,
+            'user_norms': similarity.norms,
+            # Normalized rows share the rating matrix structure
+            'normalized_data': ratings.data * np.repeat(inverse, np.diff(ratings.indptr)),
+            'genre_vocabulary': np.asarray(self.genre_index.vocabulary, dtype=str),
+            'genre_indices': self.genre_index.indicator.indices,
+            'genre_indptr': self.genre_index.indicator.indptr,
+            'content_data': features.data,
+            'content_indices': features.indices,
+            'content_indptr': features.indptr,
+            'content_neighbours': self.content_index.neighbours,
+            'content_scores': self.content_index.scores,
+        }
+        arrays.update(self.search_index.to_arrays())
+        if similarity.neighbours is not None:
+            arrays['neighbour_ids'], arrays['neighbour_scores'] = similarity.neighbours
+        for name, array in similarity.search.to_arrays().items():
+            arrays[f'search:{name}'] = array
+        if self.factor_model is not None:
+            arrays['factor_users'] = self.factor_model.user_factors
+            arrays['factor_items'] = self.factor_model.item_factors
+        for column in self.movies.columns:
+            values = self.movies[column].to_numpy()
+            arrays[f'movie_column:{column}'] = values.astype(str) if values.dtype == object else values
+        
+        meta = {
+            'movie_columns': list(self.movies.columns),
+            'n_movies': len(self.movie_ids),
+            'n_features': features.shape[1],
+            'neighbour_table_size': self.neighbour_table_size,
+            'neighbour_search': {'name': similarity.search.name, 'params': similarity.search.params()},
+            'content_features': list(self.content_index.features),
+            'content_neighbours': self.content_neighbours,
+            # Where rebuild() reloads from when no store is attached
+            'movies_file': os.path.abspath(self.movies_file) if self.movies_file else None,
+            'ratings_file': os.path.abspath(self.ratings_file) if self.ratings_file else None,
+        }
+        if self.factor_model is not None:
+            meta['factor_model'] = {'params': self.factor_model.params(), 'mean': self.factor_model.mean}
+        return arrays, meta
+    
+    @classmethod
+    def from_arrays(cls, arrays, meta, store=None, cache_size=10000, cache_ttl=300, metrics=None):
+        """Build a recommender on top of exported arrays without copying them
+        
+        When the arrays are read-only views (shared memory or a memory-mapped
+        file) the resulting model is read-only too: use rebuild() or publish
+        a new model instead of add_rating()/delete_rating().
+        """
+        recommender = cls.__new__(cls)
+        recommender.movies_file = meta.get('movies_file')
+        recommender.ratings_file = meta.get('ratings_file')
+        recommender.store = store
+        recommender.read_only = not all(array.flags.writeable for array in arrays.values())
+        recommender.matrix_backend = 'sparse'
+        recommender.neighbour_table_size = meta['neighbour_table_size']
+        recommender.neighbour_search = meta['neighbour_search']['name']
+        recommender.content_features = tuple(meta['content_features'])
+        recommender.content_neighbours = meta['content_neighbours']
+        recommender.n_factors = None
+        recommender.factor_model = None
+        if 'factor_model' in meta:
+            recommender.n_factors = meta['factor_model']['params']['n_factors']
+            recommender.factor_model = FactorModel.from_arrays(
+                meta['factor_model']['params'], meta['factor_model']['mean'],
+                arrays['factor_users'], arrays['factor_items']
+            )
+        recommender.cache = RecommendationCache(cache_size, cache_ttl) if cache_size else None
+        recommender.metrics = metrics
+        recommender._warm_start = None
+        
+        recommender.movies = pd.DataFrame({
+            column: arrays[f'movie_column:{column}'] for column in meta['movie_columns']
+        })
+        recommender.movie_ids = arrays['movie_column:movie_id']
+        recommender.movie_titles = arrays['movie_column:title']
+        recommender.movie_genres = arrays['movie_column:genres']
+        
+        n_users, n_movies = len(arrays['user_ids']), meta['n_movies']
+        ratings = sparse.csr_matrix(
+            (arrays['rating_data'], arrays['rating_indices'], arrays['rating_indptr']),
+            shape=(n_users, n_movies)
+        )
+        normalized = sparse.csr_matrix(
+            (arrays['normalized_data'], arrays['rating_indices'], arrays['rating_indptr']),
+            shape=(n_users, n_movies)
+        )
+        matrix = RatingMatrix(
+            arrays['user_ids'], recommender.movie_ids, ratings,
+            user_order=arrays['user_order'], movie_order=arrays['movie_order'],
+            user_sorted_ids=arrays.get('user_sorted_ids'), movie_sorted_ids=arrays.get('movie_sorted_ids')
+        )
+        neighbours = None
+        if 'neighbour_ids' in arrays:
+            neighbours = (arrays['neighbour_ids'], arrays['neighbour_scores'])
+        recommender.user_movie_matrix = matrix
+        recommender.movie_positions = matrix.movie_index
+        search_class = SEARCH_BACKENDS[meta['neighbour_search']['name']]
+        search_arrays = {
+            name.split(':', 1)[1]: array for name, array in arrays.items() if name.startswith('search:')
+        }
+        if search_arrays:
+            search = search_class.from_arrays(meta['neighbour_search']['params'], **search_arrays)
+        else:
+            search = search_class(**meta['neighbour_search']['params'])
+        recommender.user_similarity = UserSimilarity(
+            matrix, top_k=meta['neighbour_table_size'],
+            norms=arrays['user_norms'], normalized=normalized, neighbours=neighbours, search=search
+        )
+        
+        vocabulary = arrays['genre_vocabulary']
+        indicator = sparse.csr_matrix(
+            (np.ones(len(arrays['genre_indices']), dtype=np.float32), arrays['genre_indices'], arrays['genre_indptr']),
+            shape=(n_movies, len(vocabulary))
+        )
+        recommender.genre_index = GenreIndex.from_arrays(vocabulary, indicator)
+        if 'search_tokens' in arrays:
+            recommender.search_index = SearchIndex.from_arrays(
+                arrays['search_tokens'], arrays['search_token_indptr'], arrays['search_token_postings'],
+                recommender.genre_index, arrays.get('search_genre_indptr'), arrays.get('search_genre_postings')
+            )
+        else:
+            # Snapshots written before the search index existed
+            recommender.search_index = SearchIndex(recommender.movie_titles, recommender.genre_index)
+        
+        features = sparse.csr_matrix(
+            (arrays['content_data'], arrays['content_indices'], arrays['content_indptr']),
+            shape=(n_movies, meta['n_features'])
+        )
+        recommender.content_index = ContentIndex.from_arrays(
+            meta['content_features'], features, arrays['content_neighbours'], arrays['content_scores']
+        )
+        return recommender
+    
+    def save(self, path, sources=None):
+        """Write the prepared model to a versioned binary snapshot file
+        
+        ``sources`` is the fingerprint of the data the model was built from
+        (taken now by default).
+        """
+        arrays, meta = self.export_arrays()
+        meta['snapshot_version'] = SNAPSHOT_VERSION
+        if sources is None:
+            sources = _source_fingerprint(self.movies_file, self.ratings_file, self.store)
+        meta['sources'] = sources
+        meta['options'] = _snapshot_options(
+            self.neighbour_table_size, self.user_similarity.search, self.content_features,
+            self.content_neighbours, self.n_factors
+        )
+        write_arrays(path, arrays, meta)
+    
+    @classmethod
+    def load(cls, path, store=None, cache_size=10000, cache_ttl=300, metrics=None):
+        """Memory-map a snapshot written by save() (the model is read-only)"""
+        arrays, meta = read_arrays(path)
+        if meta.get('snapshot_version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported model snapshot version: {meta.get('snapshot_version')}")
+        return cls.from_arrays(arrays, meta, store=store, cache_size=cache_size, cache_ttl=cache_ttl,
+                               metrics=metrics)
+    
+    @classmethod
+    def load_or_build(cls, path, movies_file='movies_data.csv', ratings_file='user_ratings.csv', **kwargs):
+        """Load the snapshot at ``path`` if it matches the current sources, else build and save one
+        
+        A snapshot is stale when its format version, the model options or
+        the source fingerprint (store revision, or CSV sizes and mtimes)
+        differ from the current ones, or when it cannot be read at all.
+        """
+        store = kwargs.get('store')
+        # Taken before building, so ratings added meanwhile make the snapshot stale
+        sources = _source_fingerprint(movies_file, ratings_file, store)
+        try:
+            _, meta = read_arrays(path) if os.path.exists(path) else (None, None)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable model snapshot {path}: {e}")
+            meta = None
+        if meta is not None:
+            options = _snapshot_options(
+                kwargs.get('neighbour_table_size'), kwargs.get('neighbour_search', 'exact'),
+                kwargs.get('content_features', DEFAULT_FEATURES), kwargs.get('content_neighbours', 50),
+                kwargs.get('n_factors')
+            )
+            if (meta.get('snapshot_version') == SNAPSHOT_VERSION and meta.get('options') == options
+                    and meta.get('sources') == sources):
+                return cls.load(path, store=store, cache_size=kwargs.get('cache_size', 10000),
+                                cache_ttl=kwargs.get('cache_ttl', 300), metrics=kwargs.get('metrics'))
+        
+        return cls.build_and_save(path, movies_file, ratings_file, sources=sources, **kwargs)
+    
+    @classmethod
+    def build_and_save(cls, path, movies_file='movies_data.csv', ratings_file='user_ratings.csv', sources=None,
+                       **kwargs):
+        """Build a model and save it as the snapshot at ``path``
+        
+        The fingerprint is taken before building, like in load_or_build. A
+        failed save is reported but still returns the model; the next
+        start just rebuilds.
+        """
+        if sources is None:
+            sources = _source_fingerprint(movies_file, ratings_file, kwargs.get('store'))
+        recommender = cls(movies_file, ratings_file, **kwargs)
+        try:
+            recommender.save(path, sources)
+        except OSError as e:
+            print(f"Could not save model snapshot {path}: {e}")
+        return recommender
+    
+    def collaborative_filtering(self, user_id, n_recommendations=5, n_neighbors=3):
         """Recommend movies based on similar users' preferences"""
-        if user_id not in self.user_movie_matrix.index:
+        key = ('collaborative', user_id, n_recommendations, n_neighbors)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        matrix = self.user_movie_matrix
+        if not matrix.has_user(user_id):
             return "User not found"
         
-        # Calculate user similarity
-        user_similarity = cosine_similarity(self.user_movie_matrix)
-        user_similarity_df = pd.DataFrame(
-            user_similarity,
-            index=self.user_movie_matrix.index,
-            columns=self.user_movie_matrix.index
-        )
+        scores, similar_users = self._predict_ratings(matrix.user_index[user_id], n_neighbors)
+        with self._timed('ranking'):
+            top_cols = top_n(scores, n_recommendations)
+        recommendations = self._format_recommendations(top_cols, scores[top_cols])
+        self._cache_put(key, recommendations, self._user_tags(user_id, similar_users))
+        return recommendations
+    
+    def _predict_ratings(self, user_row, n_neighbors):
+        """Similarity-weighted ratings of every movie for one user (NaN = no prediction)
         
-        # Get similar users (excluding the user itself)
-        similar_users = user_similarity_df[user_id].sort_values(ascending=False)[1:]
+        Also returns the rows of the similar users the prediction used.
+        """
+        matrix = self.user_movie_matrix
         
-        # Get movies the user hasn't rated
-        user_ratings = self.user_movie_matrix.loc[user_id]
-        unrated_movies = user_ratings[user_ratings == 0].index
+        # Get similar users (excluding the user itself)
+        with self._timed('similarity'):
+            similar_users, similarities = self.user_similarity.most_similar(user_row, n_neighbors)
         
-        # Calculate weighted ratings from similar users
-        recommendations = {}
-        for movie_id in unrated_movies:
-            weighted_sum = 0
-            similarity_sum = 0
+        with self._timed('scoring'):
+            neighbour_ratings = matrix.values[similar_users]
             
-            for similar_user_id in similar_users.index[:3]:  # Top 3 similar users
-                rating = self.user_movie_matrix.loc[similar_user_id, movie_id]
-                if rating > 0:
-                    similarity = similar_users[similar_user_id]
-                    weighted_sum += rating * similarity
-                    similarity_sum += similarity
+            # Weighted ratings and similarity normalizers for all movies at once
+            weighted_sum = np.asarray(neighbour_ratings.T @ similarities).ravel()
+            similarity_sum = np.asarray((neighbour_ratings > 0).T @ similarities).ravel()
             
-            if similarity_sum > 0:
-                recommendations[movie_id] = weighted_sum / similarity_sum
+            scores = np.full(matrix.shape[1], np.nan)
+            predicted = similarity_sum > 0
+            scores[predicted] = weighted_sum[predicted] / similarity_sum[predicted]
+            
+            # Only recommend movies the user hasn't rated
+            rated_cols, _ = matrix.user_row(user_row)
+            scores[rated_cols] = np.nan
+        return scores, similar_users
+    
+    def matrix_factorization(self, user_id, n_recommendations=5):
+        """Recommend movies from the latent-factor model (requires n_factors)"""
+        key = ('factorization', user_id, n_recommendations)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         
-        # Get top N recommendations
-        top_movies = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)[:n_recommendations]
-        return self._format_recommendations(top_movies)
+        if self.factor_model is None:
+            return "Matrix factorization is not enabled"
+        matrix = self.user_movie_matrix
+        if not matrix.has_user(user_id):
+            return "User not found"
+        
+        user_row = matrix.user_index[user_id]
+        rated_cols, _ = matrix.user_row(user_row)
+        with self._timed('factor_scoring'):
+            top_cols, scores = self.factor_model.recommend(user_row, n_recommendations, exclude=rated_cols)
+        recommendations = self._format_recommendations(top_cols, scores)
+        # 'factors': the result depends on every user's factors, not only this user's
+        self._cache_put(key, recommendations, ['ratings', 'factors', ('user', user_id)])
+        return recommendations
+    
+    def _predict_scores(self, user_row, n_neighbors, method):
+        """Predicted ratings of unrated movies by ``method``, plus the neighbour rows used"""
+        if method == 'neighbourhood':
+            return self._predict_ratings(user_row, n_neighbors)
+        if method != 'factorization':
+            raise ValueError(f"Unknown rating method: {method}")
+        with self._timed('factor_scoring'):
+            scores = self.factor_model.scores(user_row).astype(np.float64)
+            rated_cols, _ = self.user_movie_matrix.user_row(user_row)
+            scores[rated_cols] = np.nan
+        return scores, np.zeros(0, dtype=np.int64)
+    
+    def _cache_get(self, key):
+        if self.cache is None:
+            return None
+        return self.cache.get(key)
+    
+    def _cache_put(self, key, value, tags):
+        if self.cache is not None:
+            self.cache.put(key, value, tags)
+    
+    def _user_tags(self, user_id, similar_users):
+        """Cache tags of a per-user result: the user and every neighbour it used"""
+        neighbour_ids = self.user_movie_matrix.user_ids[similar_users].tolist()
+        return ['ratings', ('user', user_id)] + [('user', uid) for uid in neighbour_ids]
     
-    def content_based_filtering(self, movie_id, n_recommendations=5):
-        """Recommend movies similar to a given movie based on genres"""
-        if movie_id not in self.movies['movie_id'].values:
+    def cache_stats(self):
+        """Hit/miss/eviction counters of the recommendation cache"""
+        if self.cache is None:
+            return {}
+        return self.cache.stats()
+    
+    def add_rating(self, user_id, movie_id, rating):
+        """Add a new rating or update an existing one without a full rebuild"""
+        self._check_writable()
+        matrix = self.user_movie_matrix
+        if movie_id not in matrix.movie_index:
             return "Movie not found"
         
-        # Get movie index
-        movie_idx = self.movies[self.movies['movie_id'] == movie_id].index[0]
+        user_row = matrix.set(user_id, movie_id, rating)
+        self._update_user(user_row)
+        self._invalidate_user(user_id)
+    
+    def delete_rating(self, user_id, movie_id):
+        """Remove a single rating without a full rebuild"""
+        self._check_writable()
+        user_row = self.user_movie_matrix.delete(user_id, movie_id)
+        if user_row is None:
+            return "Rating not found"
+        self._update_user(user_row)
+        self._invalidate_user(user_id)
+    
+    def _check_writable(self):
+        # Checked up front, so a read-only model is never left half-updated
+        if self.read_only:
+            raise ValueError("Model is read-only (attached to shared or memory-mapped arrays); "
+                             "use rebuild() or publish a new model")
+    
+    def _update_user(self, user_row):
+        """Refresh the per-user model state after one user's ratings changed"""
+        self.user_similarity.update_user(user_row)
+        if self.factor_model is not None:
+            self.factor_model.update_user(user_row, *self.user_movie_matrix.user_row(user_row))
+    
+    def _invalidate_user(self, user_id):
+        """Drop cached results of this user and of users who have them as a neighbour"""
+        if self.cache is not None:
+            self.cache.invalidate(('user', user_id))
+    
+    def _filter_mask(self, genres=None, exclude=None):
+        """Catalogue mask of movies with every genre in ``genres`` and not in the movie ids ``exclude``
         
-        # Get similarity scores
-        similarity_scores = list(enumerate(self.content_similarity[movie_idx]))
-        similarity_scores = sorted(similarity_scores, key=lambda x: x[1], reverse=True)[1:]
+        None when there is nothing to filter; "Genre not found" for an unknown genre.
+        """
+        if not genres and not exclude:
+            return None
+        positions = [self.movie_positions.get(movie_id) for movie_id in exclude or ()]
+        mask = self.search_index.mask(genres=genres, exclude=[p for p in positions if p is not None])
+        if mask is None:
+            return "Genre not found"
+        return mask
+    
+    def search_movies(self, query='', genres=None, limit=20):
+        """Movies whose title tokens start with the query's tokens and that carry every genre in ``genres``"""
+        mask = self.search_index.mask(query, genres)
+        if mask is None:
+            return "Genre not found"
+        positions = np.flatnonzero(mask)[:limit]
+        return self.movies.iloc[positions][['movie_id', 'title', 'genres']]
+    
+    def content_based_filtering(self, movie_id, n_recommendations=5, genres=None, exclude=None):
+        """Recommend movies similar to a given movie based on its content features
+        
+        Optionally only movies with every genre in ``genres`` and not in the
+        movie ids ``exclude``.
+        """
+        key = ('content', movie_id, n_recommendations, tuple(genres or ()), tuple(exclude or ()))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         
-        # Get top N similar movies
-        top_indices = [i[0] for i in similarity_scores[:n_recommendations]]
-        recommended_movies = self.movies.iloc[top_indices][['movie_id', 'title', 'genres']]
+        if movie_id not in self.movie_positions:
+            return "Movie not found"
+        mask = self._filter_mask(genres, exclude)
+        if isinstance(mask, str):
+            return mask
+        
+        # Get movie index
+        movie_idx = self.movie_positions[movie_id]
         
+        # Get top N similar movies from the precomputed neighbour index
+        with self._timed('content_neighbours'):
+            top_indices, _ = self.content_index.similar(movie_idx, n_recommendations, mask)
+        with self._timed('format'):
+            recommended_movies = self.movies.iloc[top_indices][['movie_id', 'title', 'genres']]
+        
+        self._cache_put(key, recommended_movies, ['catalogue'])
         return recommended_movies
     
-    def hybrid_recommendation(self, user_id, n_recommendations=5):
-        """Combine collaborative and content-based filtering"""
-        collab_recs = self.collaborative_filtering(user_id, n_recommendations * 2)
+    def hybrid_recommendation(self, user_id, n_recommendations=5, n_neighbors=3, method='neighbourhood',
+                              genres=None, exclude=None):
+        """Combine collaborative (neighbourhood or factorization) and content-based filtering
+        
+        ``genres`` and ``exclude`` filter candidates as in content_based_filtering.
+        """
+        key = ('hybrid', user_id, n_recommendations, n_neighbors, method, tuple(genres or ()), tuple(exclude or ()))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         
-        if isinstance(collab_recs, str):
-            return collab_recs
+        if method == 'factorization' and self.factor_model is None:
+            return "Matrix factorization is not enabled"
+        matrix = self.user_movie_matrix
+        if not matrix.has_user(user_id):
+            return "User not found"
+        mask = self._filter_mask(genres, exclude)
+        if isinstance(mask, str):
+            return mask
+        user_row = matrix.user_index[user_id]
         
-        # Get user's favorite genres from their ratings
-        user_ratings = self.ratings[self.ratings['user_id'] == user_id]
-        favorite_movies = user_ratings[user_ratings['rating'] >= 4]['movie_id'].values
+        scores, similar_users = self._predict_scores(user_row, n_neighbors, method)
+        if mask is not None:
+            scores[~mask] = np.nan
+        with self._timed('ranking'):
+            candidates = top_n(scores, n_recommendations * 2)
         
-        hybrid_scores = {}
-        for movie_id, title, genres, score in collab_recs:
+        with self._timed('genre_boost'):
+            # Get user's favorite genres from their ratings
+            rated_cols, user_ratings = matrix.user_row(user_row)
+            favorite_profile = self.genre_index.profile(rated_cols[user_ratings >= 4])
+            
             # Boost score if movie shares genres with user's favorites
-            movie_genres = self.movies[self.movies['movie_id'] == movie_id]['genres'].values[0]
-            genre_match = 0
+            genre_match = self.genre_index.overlap(candidates, favorite_profile) * 0.1
+            hybrid_scores = scores[candidates] + genre_match
+        
+        with self._timed('ranking'):
+            top = top_n(hybrid_scores, n_recommendations)
+        recommendations = self._format_recommendations(candidates[top], hybrid_scores[top])
+        tags = self._user_tags(user_id, similar_users)
+        if method == 'factorization':
+            tags.append('factors')
+        self._cache_put(key, recommendations, tags)
+        return recommendations
+    
+    def batch_recommendations(self, user_ids, n_recommendations=5, method='collaborative', n_neighbors=3,
+                              chunk_size=256):
+        """Top-N recommendations for many users at once
+        
+        Users are scored in chunks: one block similarity product finds every
+        user's neighbours, then a single (users x movies) sparse product
+        computes all predicted ratings of the chunk. Returns a dict of
+        user_id -> recommendations (or "User not found").
+        """
+        if method not in BATCH_METHODS:
+            raise ValueError(f"Unknown batch method: {method}")
+        
+        matrix = self.user_movie_matrix
+        results = {}
+        known = []
+        for user_id in user_ids:
+            if matrix.has_user(user_id):
+                known.append(user_id)
+            else:
+                results[user_id] = "User not found"
+        
+        for start in range(0, len(known), chunk_size):
+            chunk_ids = known[start:start + chunk_size]
+            rows = np.array([matrix.user_index[user_id] for user_id in chunk_ids], dtype=np.int64)
+            positions, scores = self.batch_top_n(rows, n_recommendations, method, n_neighbors)
+            for i, user_id in enumerate(chunk_ids):
+                valid = positions[i] >= 0
+                results[user_id] = self._format_recommendations(positions[i][valid], scores[i][valid])
+        return results
+    
+    def batch_top_n(self, user_rows, n_recommendations=5, method='collaborative', n_neighbors=3):
+        """Top-N catalogue positions and scores for a chunk of user rows
+        
+        Returns two (len(user_rows) x N) arrays, best first; rows with fewer
+        than N predictions are padded with position -1 and score NaN.
+        """
+        scores = self._predict_ratings_batch(user_rows, n_neighbors)
+        
+        # NaN (no prediction) sorts below every real score
+        n_candidates = n_recommendations * 2 if method == 'hybrid' else n_recommendations
+        positions, top_scores = top_k_rows(np.nan_to_num(scores, nan=-np.inf), n_candidates)
+        if method == 'hybrid':
+            boosted = top_scores + self._genre_boost_batch(user_rows, positions)
+            order, top_scores = top_k_rows(boosted, n_recommendations)
+            positions = np.take_along_axis(positions, order, axis=1)
+        
+        missing = ~np.isfinite(top_scores)
+        positions[missing] = -1
+        top_scores[missing] = np.nan
+        return positions, top_scores
+    
+    def _predict_ratings_batch(self, user_rows, n_neighbors):
+        """Predicted ratings (len(user_rows) x movies, NaN = no prediction) for many users"""
+        matrix = self.user_movie_matrix
+        with self._timed('batch_similarity'):
+            similar_users, similarities = self.user_similarity.most_similar_batch(user_rows, n_neighbors)
+        
+        with self._timed('batch_scoring'):
+            # Sparse (users x all users) weight matrix holding each user's neighbour similarities
+            n_rows, k = similar_users.shape
+            weights = sparse.csr_matrix(
+                (similarities.ravel(), similar_users.ravel(), np.arange(0, n_rows * k + 1, k)),
+                shape=(n_rows, matrix.shape[0])
+            )
+            rated = matrix.values > 0
+            weighted_sum = _dense(weights @ matrix.values)
+            similarity_sum = _dense(weights @ rated)
             
-            for fav_movie_id in favorite_movies:
-                fav_genres = self.movies[self.movies['movie_id'] == fav_movie_id]['genres'].values[0]
-                common_genres = set(movie_genres.split('|')) & set(fav_genres.split('|'))
-                genre_match += len(common_genres) * 0.1
+            scores = np.full(weighted_sum.shape, np.nan)
+            predicted = similarity_sum > 0
+            scores[predicted] = weighted_sum[predicted] / similarity_sum[predicted]
             
-            hybrid_scores[movie_id] = score + genre_match
-        
-        top_movies = sorted(hybrid_scores.items(), key=lambda x: x[1], reverse=True)[:n_recommendations]
-        return self._format_recommendations(top_movies)
+            # Only recommend movies the user hasn't rated
+            scores[_dense(rated[user_rows])] = np.nan
+        return scores
+    
+    def _genre_boost_batch(self, user_rows, candidates):
+        """Hybrid genre boost for a (users x candidates) array of movie positions"""
+        matrix = self.user_movie_matrix
+        favorites = matrix.values[user_rows] >= 4
+        profiles = _dense(favorites @ self.genre_index.indicator)
+        candidate_genres = self.genre_index.indicator[candidates.ravel()]
+        repeated = np.repeat(profiles, candidates.shape[1], axis=0)
+        boost = np.asarray(candidate_genres.multiply(repeated).sum(axis=1)).ravel()
+        return boost.reshape(candidates.shape) * 0.1
     
-    def _format_recommendations(self, movie_scores):
+    def _format_recommendations(self, positions, scores):
         """Format movie recommendations with titles and genres"""
-        recommendations = []
-        for movie_id, score in movie_scores:
-            movie_info = self.movies[self.movies['movie_id'] == movie_id].iloc[0]
-            recommendations.append((movie_id, movie_info['title'], movie_info['genres'], round(score, 2)))
-        return recommendations
+        with self._timed('format'):
+            return list(zip(
+                self.movie_ids[positions].tolist(),
+                self.movie_titles[positions].tolist(),
+                self.movie_genres[positions].tolist(),
+                np.round(scores, 2).tolist()
+            ))
     
     def get_movie_info(self, movie_id):
         """Get information about a specific movie"""
-        movie = self.movies[self.movies['movie_id'] == movie_id]
-        if movie.empty:
+        if movie_id not in self.movie_positions:
             return "Movie not found"
-        return movie.iloc[0].to_dict()
+        return self.movies.iloc[self.movie_positions[movie_id]].to_dict()
     
-    def get_user_ratings(self, user_id):
-        """Get all ratings for a specific user"""
-        user_ratings = self.ratings[self.ratings['user_id'] == user_id]
-        if user_ratings.empty:
+    def _user_rating_columns(self, user_id, ratings=None):
+        """Catalogue columns (sorted) and ratings of a user, or "User not found"
+        
+        ``ratings`` optionally supplies the user's current (movie_ids, ratings),
+        e.g. read from the store because they are newer than this model.
+        """
+        if ratings is None:
+            matrix = self.user_movie_matrix
+            if not matrix.has_user(user_id):
+                return "User not found"
+            # A user's ratings are one contiguous, column-sorted slice of the rating matrix
+            return matrix.user_row(matrix.user_index[user_id])
+        
+        movie_ids, values = ratings
+        cols = self.movie_positions.positions(movie_ids)
+        order = np.argsort(cols, kind='stable')
+        order = order[cols[order] >= 0]
+        if len(order) == 0:
             return "User not found"
+        return cols[order], np.asarray(values)[order]
+    
+    def get_user_ratings(self, user_id, ratings=None):
+        """Get all ratings for a specific user (see _user_rating_columns for ``ratings``)"""
+        found = self._user_rating_columns(user_id, ratings)
+        if isinstance(found, str):
+            return found
+        
+        rated_cols, user_ratings = found
+        return [
+            {'title': title, 'genres': genres, 'rating': rating}
+            for title, genres, rating in zip(
+                self.movie_titles[rated_cols].tolist(),
+                self.movie_genres[rated_cols].tolist(),
+                user_ratings.astype(int).tolist()  # Convert to Python int
+            )
+        ]
+    
+    def get_user_ratings_page(self, user_id, cursor=None, limit=50, ratings=None):
+        """Up to ``limit`` of a user's ratings in catalogue order after the movie id ``cursor``.
+        
+        Returns (ratings, next cursor); the next cursor is None on the last page.
+        """
+        found = self._user_rating_columns(user_id, ratings)
+        if isinstance(found, str):
+            return found
+        start_col = 0
+        if cursor is not None:
+            if cursor not in self.movie_positions:
+                return "Movie not found"
+            start_col = self.movie_positions[cursor] + 1
         
-        result = []
-        for _, row in user_ratings.iterrows():
-            movie_info = self.movies[self.movies['movie_id'] == row['movie_id']].iloc[0]
-            result.append({
-                'title': str(movie_info['title']),
-                'genres': str(movie_info['genres']),
-                'rating': int(row['rating'])  # Convert to Python int
-            })
-        return result
+        # Columns are sorted, so a page is a slice of them
+        rated_cols, user_ratings = found
+        start = np.searchsorted(rated_cols, start_col)
+        cols, ratings = rated_cols[start:start + limit], user_ratings[start:start + limit]
+        page = [
+            {'movie_id': movie_id, 'title': title, 'genres': genres, 'rating': rating}
+            for movie_id, title, genres, rating in zip(
+                self.movie_ids[cols].tolist(),
+                self.movie_titles[cols].tolist(),
+                self.movie_genres[cols].tolist(),
+                ratings.astype(int).tolist()
+            )
+        ]
+        next_cursor = page[-1]['movie_id'] if start + limit < len(rated_cols) else None
+        return page, next_cursor
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import json
+import threading
+
+from flask import Response, request
+
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+PAGE_LIMIT_MAX = 500
+PAGE_CACHE_SIZE = 1024
+
+
+class EncodedJSON:
+    """A JSON body encoded once, with a content ETag and a gzip form made on first use"""
+
+    __slots__ = ('body', 'etag', '_gzipped')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self._gzipped = None
+
+    @property
+    def compressible(self):
+        return len(self.body) >= GZIP_MIN_BYTES
+
+    def gzipped(self):
+        """The gzip body, compressed once and kept for payloads that are cached"""
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, 6)
+        return self._gzipped
+
+    @classmethod
+    def from_object(cls, obj):
+        return cls(json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+
+
+def json_response(payload):
+    """Response for an EncodedJSON: 304 on a matching If-None-Match, gzip when accepted
+
+    The gzip and identity bodies are different representations, so each
+    gets its own ETag (the gzip one ends in "-gzip").
+    """
+    use_gzip = payload.compressible and request.accept_encodings['gzip']
+    etag = f'{payload.etag}-gzip' if use_gzip else payload.etag
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(payload.gzipped(), mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(payload.body, mimetype='application/json')
+    response.set_etag(etag)
+    # Per-user data: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def page_limit():
+    """The ?limit= of a paginated request (None for the whole list), clamped to PAGE_LIMIT_MAX"""
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return None
+    return max(1, min(limit, PAGE_LIMIT_MAX))
+
+
+class CataloguePayload:
+    """Pre-encoded /api/movies responses for the current catalogue.
+
+    The catalogue is encoded once per model snapshot, one JSON segment per
+    movie; the full list and every page are joined from those segments
+    and gzipped the first time a client accepts gzip. ETags hash the content, so a rebuild that leaves the
+    catalogue unchanged keeps the ETags (and the cached pages) valid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._movies = None
+        # (movie segments, full list payload, page payloads by (start, limit))
+        self._state = None
+
+    def _current(self, recommender):
+        with self._lock:
+            if recommender.movies is self._movies:
+                return self._state
+        # One line per record; to_json also turns NumPy types and NaN into JSON
+        segments = recommender.movies.to_json(orient='records', lines=True).encode('utf-8').splitlines()
+        full = EncodedJSON(b'[' + b','.join(segments) + b']')
+        with self._lock:
+            if self._state is None or full.etag != self._state[1].etag:
+                self._state = (segments, full, {})
+            self._movies = recommender.movies
+            return self._state
+
+    def full(self, recommender):
+        return self._current(recommender)[1]
+
+    def page(self, recommender, cursor, limit):
+        """Up to ``limit`` movies after the movie id ``cursor`` (None: from the start), or None for an unknown cursor"""
+        segments, _, pages = self._current(recommender)
+        if cursor is None:
+            start = 0
+        else:
+            position = recommender.movie_positions.get(cursor)
+            if position is None:
+                return None
+            start = position + 1
+
+        payload = pages.get((start, limit))
+        if payload is None:
+            end = min(start + limit, len(segments))
+            next_cursor = int(recommender.movie_ids[end - 1]) if end < len(segments) else None
+            payload = EncodedJSON(
+                b'{"movies":[' + b','.join(segments[start:end]) + b'],"next_cursor":'
+                + json.dumps(next_cursor).encode('utf-8') + b'}'
+            )
+            with self._lock:
+                if len(pages) >= PAGE_CACHE_SIZE:
+                    pages.clear()
+                pages[(start, limit)] = payload
+        return payload
@@ -0,0 +1,101 @@
+import re
+
+import numpy as np
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def _tokens(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class SearchIndex:
+    """Inverted index over the catalogue for search and filtering.
+
+    Genres and lower-cased title tokens each map to a posting list: the
+    sorted catalogue positions of the movies carrying them, stored CSR
+    style (one indptr/indices pair per vocabulary). Title tokens are kept
+    sorted, so a prefix query is a binary-search range of tokens. Queries
+    and filters combine postings as boolean masks over the catalogue.
+    """
+
+    def __init__(self, titles, genre_index):
+        self.n_movies = len(titles)
+        self._attach_genres(genre_index)
+
+        rows, tokens = [], []
+        for position, title in enumerate(titles):
+            for token in set(_tokens(title)):
+                rows.append(position)
+                tokens.append(token)
+        self.tokens, cols = np.unique(np.asarray(tokens, dtype=str), return_inverse=True)
+        by_token = sparse.csc_matrix(
+            (np.ones(len(rows), dtype=np.int8), (np.asarray(rows, dtype=np.int64), cols.ravel())),
+            shape=(self.n_movies, len(self.tokens))
+        )
+        by_token.sort_indices()
+        self.token_indptr, self.token_postings = by_token.indptr, by_token.indices
+
+    @classmethod
+    def from_arrays(cls, tokens, token_indptr, token_postings, genre_index, genre_indptr=None,
+                    genre_postings=None):
+        """Attach prebuilt postings; without genre postings they are derived from the genre index"""
+        index = cls.__new__(cls)
+        index.n_movies = genre_index.indicator.shape[0]
+        index._attach_genres(genre_index, genre_indptr, genre_postings)
+        index.tokens, index.token_indptr, index.token_postings = tokens, token_indptr, token_postings
+        return index
+
+    def to_arrays(self):
+        return {
+            'search_tokens': self.tokens,
+            'search_token_indptr': self.token_indptr,
+            'search_token_postings': self.token_postings,
+            'search_genre_indptr': self.genre_indptr,
+            'search_genre_postings': self.genre_postings,
+        }
+
+    def _attach_genres(self, genre_index, genre_indptr=None, genre_postings=None):
+        self.genre_ids = {str(genre).lower(): i for i, genre in enumerate(genre_index.vocabulary)}
+        if genre_indptr is None:
+            by_genre = genre_index.indicator.tocsc()
+            by_genre.sort_indices()
+            genre_indptr, genre_postings = by_genre.indptr, by_genre.indices
+        self.genre_indptr, self.genre_postings = genre_indptr, genre_postings
+
+    def genre_mask(self, genres):
+        """Movies carrying every one of ``genres`` (case-insensitive), or None for an unknown genre"""
+        mask = np.ones(self.n_movies, dtype=bool)
+        for genre in genres:
+            genre_id = self.genre_ids.get(str(genre).lower())
+            if genre_id is None:
+                return None
+            carries = np.zeros(self.n_movies, dtype=bool)
+            carries[self.genre_postings[self.genre_indptr[genre_id]:self.genre_indptr[genre_id + 1]]] = True
+            mask &= carries
+        return mask
+
+    def title_mask(self, query):
+        """Movies whose title has a token starting with every token of ``query``"""
+        mask = np.ones(self.n_movies, dtype=bool)
+        for prefix in _tokens(query):
+            # Every token in [prefix, prefix + max char) starts with prefix
+            start = np.searchsorted(self.tokens, prefix, side='left')
+            end = np.searchsorted(self.tokens, prefix + '\U0010ffff', side='left')
+            # The postings of a token range are one contiguous slice
+            matched = np.zeros(self.n_movies, dtype=bool)
+            matched[self.token_postings[self.token_indptr[start]:self.token_indptr[end]]] = True
+            mask &= matched
+        return mask
+
+    def mask(self, query='', genres=(), exclude=()):
+        """Movies matching a title query and genres, minus the ``exclude`` positions (None: unknown genre)"""
+        mask = self.genre_mask(genres or ())
+        if mask is None:
+            return None
+        if query:
+            mask &= self.title_mask(query)
+        if exclude is not None and len(exclude):
+            mask[np.asarray(exclude, dtype=np.int64)] = False
+        return mask
@@ -0,0 +1,155 @@
+import argparse
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+from array_file import read_arrays, write_arrays
+from recommendation_system import MovieRecommender
+from storage import RecommenderStore
+
+CURRENT_FILE = 'CURRENT'
+
+
+def _model_path(directory, generation):
+    return os.path.join(directory, f'model-{generation}.bin')
+
+
+def current_generation(directory):
+    """Generation number of the currently published model (0 if none)"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+@contextmanager
+def _publish_lock(directory):
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def publish(recommender, directory, keep=2):
+    """Write the model's arrays as a new generation and atomically make it current.
+
+    Workers still mapping an older generation keep working on it (the
+    kernel keeps unlinked files alive while they are mapped); only the
+    ``keep`` most recent generation files stay on disk.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _publish_lock(directory):
+        return _publish_locked(recommender, directory, keep)
+
+
+def publish_if_missing(build, directory, keep=2):
+    """Publish ``build()`` unless a model is published already; returns the current generation.
+
+    The check and the build happen under the publish lock, so when many
+    workers start together only the first one builds a model.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _publish_lock(directory):
+        generation = current_generation(directory)
+        if generation == 0:
+            generation = _publish_locked(build(), directory, keep)
+    return generation
+
+
+def _publish_locked(recommender, directory, keep):
+    generation = current_generation(directory) + 1
+    arrays, meta = recommender.export_arrays()
+    meta['generation'] = generation
+    write_arrays(_model_path(directory, generation), arrays, meta)
+
+    tmp_path = os.path.join(directory, f'{CURRENT_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(str(generation))
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+
+    for old in range(generation - keep, 0, -1):
+        try:
+            os.remove(_model_path(directory, old))
+        except FileNotFoundError:
+            break
+    return generation
+
+
+class SharedModel:
+    """A worker's handle on the model published in ``directory``.
+
+    get() returns a read-only MovieRecommender attached zero-copy to the
+    memory-mapped model file, so every worker shares the same physical
+    pages. At most every ``check_interval`` seconds it checks the
+    generation counter and, when a newer model was published, swaps to it
+    in one assignment.
+    """
+
+    def __init__(self, directory, store=None, check_interval=1.0, metrics=None):
+        self.directory = directory
+        self.store = store
+        self.metrics = metrics
+        self.check_interval = check_interval
+        self.generation = 0
+        self.recommender = None
+        self._last_check = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self.recommender is None or now - self._last_check >= self.check_interval:
+            self._last_check = now
+            generation = current_generation(self.directory)
+            if generation != self.generation:
+                self._attach(generation)
+        return self.recommender
+
+    def _attach(self, generation):
+        while True:
+            try:
+                arrays, meta = read_arrays(_model_path(self.directory, generation))
+                break
+            except FileNotFoundError:
+                # Superseded while we were looking: keep serving the current
+                # model until the next check, or follow the newer generation
+                # when there is no model yet
+                if self.recommender is not None:
+                    return
+                latest = current_generation(self.directory)
+                if latest == generation:
+                    raise
+                generation = latest
+        self.recommender = MovieRecommender.from_arrays(arrays, meta, store=self.store, metrics=self.metrics)
+        self.generation = generation
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the model and publish it for shared-memory workers')
+    parser.add_argument('--dir', default='model')
+    parser.add_argument('--db', default='recommender.db')
+    parser.add_argument('--factors', type=int, default=0, help='matrix factorization factors (0 disables)')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='keep running and republish when the store changes')
+    args = parser.parse_args()
+
+    store = RecommenderStore(args.db)
+    revision = None
+    recommender = None
+    while True:
+        if store.revision() != revision:
+            revision = store.revision()
+            started = time.time()
+            # Later generations start from the previous model's factors
+            recommender = MovieRecommender(store=store, cache_size=0, n_factors=args.factors, warm_start=recommender)
+            generation = publish(recommender, args.dir)
+            print(f"Published generation {generation} in {time.time() - started:.2f}s")
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import numpy as np
+from scipy import sparse
+
+from neighbour_search import ExactSearch
+from ranking import top_k_rows, top_n
+
+# Neighbours are ranked on similarities rounded to this many decimals, so
+# block and row products (which may differ in the last bit) break ties alike
+SIMILARITY_DECIMALS = 12
+
+
+def _top_neighbours(block, k):
+    """top_k_rows of a similarity block, ranked on rounded similarities"""
+    top, _ = top_k_rows(np.round(block, SIMILARITY_DECIMALS), k)
+    return top, np.take_along_axis(block, top, axis=1)
+
+
+class UserSimilarity:
+    """Cosine similarity between users, computed one user row at a time.
+
+    Rating rows are normalized once, so the similarities of one user to all
+    others are a single (sparse) matrix-vector product. Optionally a top-K
+    neighbour table is precomputed for every user. When a user's ratings
+    change (update_user), every user whose table row may no longer be exact
+    falls back to the row computation until refresh_neighbours() runs.
+    ``search`` is the neighbour search backend used for that row
+    computation (exact scan by default, see neighbour_search.py).
+    """
+
+    def __init__(self, matrix, top_k=None, chunk_size=1024, norms=None, normalized=None, neighbours=None,
+                 search=None):
+        self.matrix = matrix
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        self.search = search if search is not None else ExactSearch()
+        self.norms = None
+        self.normalized = None
+        self.neighbours = None
+        self._stale_users = set()
+        self._normalized_source = None
+        if norms is None:
+            self.fit()
+        else:
+            # Attach prebuilt (possibly shared, read-only) arrays
+            self.norms = norms
+            self.normalized = normalized
+            self.neighbours = neighbours
+            self._normalized_source = matrix.values
+
+    def fit(self):
+        """Recompute norms, normalized rows, the search index and (if enabled) the neighbour table"""
+        self.norms = self.matrix.row_norms()
+        self._normalize()
+        self.search.fit(self.normalized)
+        if self.top_k:
+            self.refresh_neighbours()
+
+    def _normalize(self):
+        values = self.matrix.values
+        inverse = np.zeros_like(self.norms)
+        np.divide(1.0, self.norms, out=inverse, where=self.norms > 0)
+        if sparse.issparse(values):
+            # Keep exactly the structure of the rating matrix so rows can be patched
+            self.normalized = values.copy()
+            self.normalized.data = values.data * np.repeat(inverse, np.diff(values.indptr))
+        else:
+            self.normalized = values * inverse[:, None]
+        self._normalized_source = values
+
+    def _normalized_row(self, row):
+        if sparse.issparse(self.normalized):
+            return self.normalized[row].toarray().ravel()
+        return self.normalized[row]
+
+    def _ensure_normalized(self):
+        if self._normalized_source is not self.matrix.values:
+            # The matrix structure changed (new user or new rating slot)
+            self._normalize()
+
+    def most_similar(self, row, k):
+        """Rows and scores of the k users most similar to ``row`` (excluding itself)"""
+        neighbours = self.neighbours
+        if (neighbours is not None and k <= self.top_k
+                and row < len(neighbours[0]) and row not in self._stale_users):
+            return neighbours[0][row, :k], neighbours[1][row, :k].astype(np.float64)
+        return self.search_neighbours(row, k)
+
+    def search_neighbours(self, row, k, search=None):
+        """Rows and scores of the k most similar users found by a search backend"""
+        search = search if search is not None else self.search
+        self._ensure_normalized()
+        query = self._normalized_row(row)
+        candidates = search.candidates(query, self.normalized.shape[0])
+        if candidates is None:
+            scores = np.asarray(self.normalized @ query, dtype=np.float64).ravel()
+            scores[row] = np.nan
+            top = top_n(np.round(scores, SIMILARITY_DECIMALS), k)
+            return top, scores[top]
+
+        scores = np.asarray(self.normalized[candidates] @ query, dtype=np.float64).ravel()
+        scores[candidates == row] = np.nan
+        top = top_n(np.round(scores, SIMILARITY_DECIMALS), k)
+        return candidates[top], scores[top]
+
+    def most_similar_batch(self, rows, k):
+        """Neighbour rows and scores (len(rows) x k) for many users from one block product"""
+        self._ensure_normalized()
+        if not isinstance(self.search, ExactSearch):
+            return self._search_batch(rows, k)
+        block = self.normalized[rows] @ self.normalized.T
+        block = block.toarray() if sparse.issparse(block) else np.asarray(block)
+        block[np.arange(len(rows)), rows] = -np.inf
+        return _top_neighbours(block, min(k, self.normalized.shape[0] - 1))
+
+    def _search_batch(self, rows, k):
+        """most_similar_batch through an approximate backend, one query per row"""
+        k = min(k, self.normalized.shape[0] - 1)
+        # Rows with fewer than k candidates are padded with zero-weight neighbours
+        ids = np.zeros((len(rows), max(k, 0)), dtype=np.int64)
+        scores = np.zeros((len(rows), max(k, 0)), dtype=np.float64)
+        for i, row in enumerate(rows):
+            found, found_scores = self.search_neighbours(row, k)
+            ids[i, :len(found)] = found
+            scores[i, :len(found)] = found_scores
+        return ids, scores
+
+    def update_user(self, row):
+        """Refresh one user's norm and normalized row after their ratings changed"""
+        if row >= len(self.norms):
+            self.norms = np.append(self.norms, np.zeros(row + 1 - len(self.norms)))
+        cols, data = self.matrix.user_row(row)
+        norm = np.sqrt(np.square(data, dtype=np.float64).sum())
+        self.norms[row] = norm
+
+        if self._normalized_source is self.matrix.values:
+            # Same sparsity structure: patch the normalized row in place
+            scale = 1.0 / norm if norm > 0 else 0.0
+            if sparse.issparse(self.normalized):
+                start, end = self.normalized.indptr[row], self.normalized.indptr[row + 1]
+                self.normalized.data[start:end] = data * scale
+            else:
+                self.normalized[row] = self.matrix.values[row] * scale
+        self._stale_users.add(row)
+        if self.neighbours is not None:
+            self._mark_stale_neighbours(row)
+
+    def _mark_stale_neighbours(self, row):
+        """Mark every user whose neighbour table row may have changed with ``row``'s ratings
+
+        A table row is out of date when it lists ``row`` (that score moved)
+        or when ``row`` now scores at least as high as its last entry.
+        """
+        ids, scores = self.neighbours
+        if ids.shape[1] == 0:
+            return
+        self._ensure_normalized()
+        similar = np.asarray(self.normalized @ self._normalized_row(row)).ravel()[:len(ids)]
+        # A little slack: block and row products may round differently
+        changed = (ids == row).any(axis=1) | (similar >= scores[:, -1] - 1e-9)
+        self._stale_users.update(np.flatnonzero(changed).tolist())
+
+    def refresh_neighbours(self):
+        """Rebuild the top-K neighbour table for every user, in chunks"""
+        self._ensure_normalized()
+        normalized = self.normalized
+        n_users = normalized.shape[0]
+        k = min(self.top_k, n_users - 1)
+        ids = np.zeros((n_users, max(k, 0)), dtype=np.int32)
+        scores = np.zeros((n_users, max(k, 0)), dtype=np.float64)
+
+        for start in range(0, n_users if k > 0 else 0, self.chunk_size):
+            end = min(start + self.chunk_size, n_users)
+            block = normalized[start:end] @ normalized.T
+            block = block.toarray() if sparse.issparse(block) else np.asarray(block)
+            block[np.arange(end - start), np.arange(start, end)] = -np.inf
+            ids[start:end], scores[start:end] = _top_neighbours(block, k)
+
+        self.neighbours = (ids, scores)
+        self._stale_users = set()
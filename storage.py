@@ -0,0 +1,221 @@
+import argparse
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from accounts import hash_password, is_hashed
+from rating_matrix import RATING_DTYPES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratings (
+    user_id INTEGER NOT NULL,
+    movie_id INTEGER NOT NULL,
+    rating INTEGER NOT NULL,
+    PRIMARY KEY (user_id, movie_id)
+);
+CREATE INDEX IF NOT EXISTS idx_ratings_movie_id ON ratings (movie_id);
+CREATE TABLE IF NOT EXISTS revision (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO revision (id, value) VALUES (0, 0);
+CREATE TABLE IF NOT EXISTS user_revisions (
+    user_id INTEGER PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    email TEXT
+);
+"""
+
+
+class RecommenderStore:
+    """SQLite storage for movies, ratings and users.
+
+    Uses WAL mode so readers never block the single writer, and one
+    connection per thread (sqlite3 connections are not thread-safe).
+    Ratings are keyed on (user_id, movie_id) and indexed on movie_id, so a
+    rating is a single-row upsert instead of a whole-file rewrite.
+    Passwords are stored as salted hashes (see accounts.py); plain-text
+    passwords left by older versions are hashed on open. Every rating
+    change also records the revision it produced for its user, so
+    results computed at an older revision can be checked per user.
+    """
+
+    def __init__(self, path='recommender.db'):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            self._hash_plaintext_passwords(conn)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def is_empty(self):
+        """Whether no catalogue has been imported yet"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'movies'"
+        ).fetchone()
+        return row is None
+
+    def import_csv(self, movies_file='movies_data.csv', ratings_file='user_ratings.csv', users_file='users.csv'):
+        """One-shot import of the legacy CSV files (replaces the catalogue, upserts the rest)"""
+        movies = pd.read_csv(movies_file)
+        ratings = pd.read_csv(ratings_file)
+        users = pd.read_csv(users_file) if users_file else None
+
+        with self._connection() as conn:
+            # The catalogue may carry extra feature columns (cast, director, year)
+            movies.to_sql('movies', conn, if_exists='replace', index=False)
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_movies_movie_id ON movies (movie_id)')
+            self._upsert_ratings(conn, ratings[['user_id', 'movie_id', 'rating']].itertuples(index=False))
+            self._bump_revision(conn)
+            if users is not None:
+                users = users[['user_id', 'username', 'password', 'email']].astype(object)
+                users['password'] = [p if is_hashed(p) else hash_password(str(p)) for p in users['password']]
+                conn.executemany(
+                    'INSERT OR REPLACE INTO users (user_id, username, password, email) VALUES (?, ?, ?, ?)',
+                    users.itertuples(index=False)
+                )
+
+    @staticmethod
+    def _hash_plaintext_passwords(conn):
+        rows = conn.execute('SELECT user_id, password FROM users').fetchall()
+        conn.executemany(
+            'UPDATE users SET password = ? WHERE user_id = ?',
+            [(hash_password(row['password']), row['user_id']) for row in rows if not is_hashed(row['password'])]
+        )
+
+    def load_movies(self):
+        return pd.read_sql_query('SELECT * FROM movies ORDER BY rowid', self._connection())
+
+    def iter_ratings(self, chunk_size=1_000_000):
+        """All ratings as DataFrame chunks with compact dtypes"""
+        return pd.read_sql_query(
+            'SELECT user_id, movie_id, rating FROM ratings',
+            self._connection(),
+            chunksize=chunk_size,
+            dtype=RATING_DTYPES
+        )
+
+    def user_ratings(self, user_id):
+        """One user's (movie_ids, ratings) arrays, read through the primary key"""
+        rows = self._connection().execute(
+            'SELECT movie_id, rating FROM ratings WHERE user_id = ?', (int(user_id),)
+        ).fetchall()
+        return (
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype=np.int64)
+        )
+
+    def upsert_rating(self, user_id, movie_id, rating):
+        self.upsert_ratings([(user_id, movie_id, rating)])
+
+    def upsert_ratings(self, rows):
+        """Insert or update many (user_id, movie_id, rating) rows in one transaction"""
+        rows = list(rows)
+        with self._connection() as conn:
+            self._upsert_ratings(conn, rows)
+            self._bump_revision(conn)
+            self._touch_users(conn, {int(user_id) for user_id, _, _ in rows})
+
+    @staticmethod
+    def _upsert_ratings(conn, rows):
+        conn.executemany(
+            'INSERT INTO ratings (user_id, movie_id, rating) VALUES (?, ?, ?) '
+            'ON CONFLICT (user_id, movie_id) DO UPDATE SET rating = excluded.rating',
+            ((int(u), int(m), int(r)) for u, m, r in rows)
+        )
+
+    def delete_rating(self, user_id, movie_id):
+        with self._connection() as conn:
+            cursor = conn.execute(
+                'DELETE FROM ratings WHERE user_id = ? AND movie_id = ?',
+                (user_id, movie_id)
+            )
+            self._bump_revision(conn)
+            self._touch_users(conn, [user_id])
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _bump_revision(conn):
+        conn.execute('UPDATE revision SET value = value + 1 WHERE id = 0')
+
+    @staticmethod
+    def _touch_users(conn, user_ids):
+        """Record the current revision as the last rating change of ``user_ids``"""
+        conn.executemany(
+            'INSERT INTO user_revisions (user_id, revision) '
+            'SELECT ?, value FROM revision WHERE id = 0 '
+            'ON CONFLICT (user_id) DO UPDATE SET revision = excluded.revision',
+            ((user_id,) for user_id in user_ids)
+        )
+
+    def revision(self):
+        """Counter bumped by every catalogue or rating change, across processes"""
+        return self._connection().execute('SELECT value FROM revision WHERE id = 0').fetchone()[0]
+
+    def user_revision(self, user_id):
+        """Revision of the user's last rating change through this store (0 if none)"""
+        row = self._connection().execute(
+            'SELECT revision FROM user_revisions WHERE user_id = ?', (int(user_id),)
+        ).fetchone()
+        return row[0] if row is not None else 0
+
+    def load_users(self):
+        """Every user record"""
+        return [
+            dict(row) for row in
+            self._connection().execute('SELECT user_id, username, password, email FROM users')
+        ]
+
+    def get_user(self, username):
+        """User record for a username, or None"""
+        row = self._connection().execute(
+            'SELECT user_id, username, password, email FROM users WHERE username = ?',
+            (username,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def create_user(self, username, password_hash, email):
+        """Insert a new user and return their id, or None if the username is taken"""
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute(
+                    'INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
+                    (username, password_hash, email)
+                )
+        except sqlite3.IntegrityError:
+            return None
+        return cursor.lastrowid
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import the CSV data files into the SQLite store')
+    parser.add_argument('--db', default='recommender.db')
+    parser.add_argument('--movies', default='movies_data.csv')
+    parser.add_argument('--ratings', default='user_ratings.csv')
+    parser.add_argument('--users', default='users.csv')
+    args = parser.parse_args()
+
+    store = RecommenderStore(args.db)
+    store.import_csv(args.movies, args.ratings, args.users)
+    print(f"Imported {args.movies}, {args.ratings} and {args.users} into {args.db}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from accounts import UserIndex, hash_password, is_hashed, verify_password
+from storage import RecommenderStore
+
+MOVIES_FILE = 'movies_data.csv'
+
+
+def test_hash_and_verify_round_trip():
+    stored = hash_password('secret', iterations=1000)
+    assert is_hashed(stored)
+    assert stored != hash_password('secret', iterations=1000)
+    assert verify_password('secret', stored)
+    assert not verify_password('Secret', stored)
+    assert not verify_password('', stored)
+
+
+@pytest.mark.parametrize('stored', [
+    'pbkdf2_sha256$',
+    'pbkdf2_sha256$1000$abcd',
+    'pbkdf2_sha256$1000$ab$cd$ef',
+    'pbkdf2_sha256$many$abcd$ef',
+    'pbkdf2_sha256$1000$not hex$ef',
+    'pbkdf2_sha256$0$abcd$ef',
+    'pass123',
+    None,
+])
+def test_malformed_hashes_never_match(stored):
+    assert verify_password('pass123', stored) is False
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RecommenderStore(str(tmp_path / 'accounts.db'))
+
+
+def test_user_index_authenticates_and_rejects_duplicates(store):
+    users = UserIndex(store)
+    user_id = users.create('asha', 'secret', 'asha@example.com')
+    assert user_id is not None
+    assert users.authenticate('asha', 'secret')['user_id'] == user_id
+    assert users.authenticate('asha', 'wrong') is None
+    assert users.authenticate('nobody', 'secret') is None
+    assert users.create('asha', 'other', 'other@example.com') is None
+    assert store.create_user('asha', hash_password('other'), 'other@example.com') is None
+
+    # Another process's index picks the user up from the store
+    assert UserIndex(store).authenticate('asha', 'secret')['user_id'] == user_id
+
+
+def test_import_hashes_plaintext_passwords(store, tmp_path):
+    ratings_file = tmp_path / 'ratings.csv'
+    users_file = tmp_path / 'users.csv'
+    pd.DataFrame({'user_id': [1], 'movie_id': [1], 'rating': [4]}).to_csv(ratings_file, index=False)
+    pd.DataFrame({
+        'user_id': [1, 2], 'username': ['rajesh', 'priya'],
+        'password': ['pass123', hash_password('hunter2')], 'email': ['r@example.com', 'p@example.com'],
+    }).to_csv(users_file, index=False)
+    store.import_csv(MOVIES_FILE, ratings_file, users_file)
+
+    stored = {user['username']: user['password'] for user in store.load_users()}
+    assert all(is_hashed(password) for password in stored.values())
+    users = UserIndex(store)
+    assert users.authenticate('rajesh', 'pass123')['user_id'] == 1
+    assert users.authenticate('priya', 'hunter2')['user_id'] == 2
+
+
+def test_plaintext_passwords_left_in_the_store_are_hashed_on_open(store):
+    with store._connection() as conn:
+        conn.execute("INSERT INTO users (username, password, email) VALUES ('old', 'pass123', 'o@example.com')")
+    reopened = RecommenderStore(store.path)
+    assert is_hashed(reopened.get_user('old')['password'])
+    assert UserIndex(reopened).authenticate('old', 'pass123') is not None
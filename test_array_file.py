@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from array_file import read_arrays, write_arrays
+
+
+def _write(path):
+    arrays = {
+        'ids': np.arange(1000, dtype=np.int64),
+        'scores': np.linspace(0, 1, 12, dtype=np.float32).reshape(3, 4),
+        'titles': np.array(['Vikram', 'Jailer'], dtype=str),
+        'empty': np.zeros(0, dtype=np.int32),
+    }
+    write_arrays(path, arrays, {'version': 1})
+    return arrays
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(tmp_path, mmap):
+    path = tmp_path / 'model.arrays'
+    arrays = _write(path)
+    loaded, meta = read_arrays(path, mmap=mmap)
+    assert meta == {'version': 1}
+    assert loaded.keys() == arrays.keys()
+    for name, array in arrays.items():
+        assert loaded[name].dtype == array.dtype
+        np.testing.assert_array_equal(loaded[name], array)
+    assert not list(tmp_path.glob('*.tmp*'))
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'model.arrays'
+    path.write_bytes(b'not an array file at all')
+    with pytest.raises(ValueError):
+        read_arrays(path)
+
+
+@pytest.mark.parametrize('keep', [4, 12, 40])
+def test_rejects_truncated_header(tmp_path, keep):
+    path = tmp_path / 'model.arrays'
+    _write(path)
+    path.write_bytes(path.read_bytes()[:keep])
+    with pytest.raises(ValueError):
+        read_arrays(path)
+
+
+def test_rejects_truncated_arrays(tmp_path):
+    path = tmp_path / 'model.arrays'
+    _write(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    with pytest.raises(ValueError):
+        read_arrays(path)
+
+
+def test_rejects_corrupt_header(tmp_path):
+    path = tmp_path / 'model.arrays'
+    _write(path)
+    data = bytearray(path.read_bytes())
+    data[20:30] = b'\xff' * 10
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        read_arrays(path)
@@ -0,0 +1,64 @@
+from cache import RecommendationCache
+
+
+def test_invalidate_evicts_only_tagged_entries():
+    cache = RecommendationCache()
+    cache.put('a', 1, tags=[('user', 1), 'catalogue'])
+    cache.put('b', 2, tags=[('user', 2)])
+    cache.put('c', 3)
+    cache.invalidate(('user', 1))
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.get('c') == 3
+    cache.invalidate('catalogue')
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_put_replaces_tags():
+    cache = RecommendationCache()
+    cache.put('a', 1, tags=['ratings'])
+    cache.put('a', 2, tags=['factors'])
+    cache.invalidate('ratings')
+    assert cache.get('a') == 2
+    cache.invalidate('factors')
+    assert cache.get('a') is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache = RecommendationCache(ttl=10)
+    cache.put('a', 1)
+    now[0] = 109.0
+    assert cache.get('a') == 1
+    now[0] = 111.0
+    assert cache.get('a') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RecommendationCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+
+def test_inherit_copies_live_entries_except_dropped_tags():
+    old = RecommendationCache()
+    old.put('a', 1, tags=[('user', 1)])
+    old.put('b', 2, tags=[('user', 2)])
+    old.put('c', 3, tags=['factors'])
+    new = RecommendationCache()
+    new.inherit(old, [('user', 1), 'factors'])
+    assert new.get('a') is None
+    assert new.get('b') == 2
+    assert new.get('c') is None
+    # Later writes to the old cache stay there
+    old.put('d', 4, tags=[('user', 2)])
+    assert new.get('d') is None
+    new.invalidate(('user', 2))
+    assert new.get('b') is None
+    assert old.get('b') == 2
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from precompute import PrecomputedRecommendations, precompute
+from recommendation_system import MovieRecommender
+
+MOVIES_FILE = 'movies_data.csv'
+
+
+def _ratings_file(path, n_users=80, seed=0):
+    rng = np.random.default_rng(seed)
+    movie_ids = pd.read_csv(MOVIES_FILE)['movie_id'].to_numpy()
+    rows = [
+        (user_id, int(movie_id), int(rng.integers(1, 6)))
+        for user_id in range(1, n_users + 1)
+        for movie_id in rng.choice(movie_ids, rng.integers(2, 10), replace=False)
+    ]
+    pd.DataFrame(rows, columns=['user_id', 'movie_id', 'rating']).to_csv(path, index=False)
+    return path
+
+
+def _comparable(recommendations):
+    """Scores plus the movies at each score above the lowest (tie order and ties at the cut may differ)"""
+    if recommendations is None:
+        return None
+    scores = [score for _, _, _, score in recommendations]
+    above_cut = {}
+    for movie_id, _, _, score in recommendations:
+        if score > min(scores):
+            above_cut.setdefault(score, set()).add(movie_id)
+    return scores, above_cut
+
+
+def test_precomputed_results_match_the_live_model(tmp_path):
+    ratings_file = _ratings_file(tmp_path / 'ratings.csv')
+    precompute(tmp_path / 'recommendations.bin', n=6, processes=1, chunk_size=16,
+               movies_file=MOVIES_FILE, ratings_file=ratings_file)
+    precomputed = PrecomputedRecommendations(tmp_path / 'recommendations.bin')
+    live = MovieRecommender(MOVIES_FILE, ratings_file, cache_size=0)
+
+    for user_id in range(1, 81):
+        for n in (3, 6):
+            assert (_comparable(precomputed.recommend('collaborative', user_id, n))
+                    == _comparable(live.collaborative_filtering(user_id, n)))
+        assert _comparable(precomputed.recommend('hybrid', user_id, 6)) == _comparable(live.hybrid_recommendation(user_id, 6))
+        # Fewer hybrid results come from a smaller candidate pool: left to the live model
+        assert precomputed.recommend('hybrid', user_id, 3) is None
+    assert precomputed.recommend('collaborative', 1, 7) is None
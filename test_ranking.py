@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from ranking import top_k_rows, top_n
+
+
+def _expected(block, k):
+    order = np.argsort(-block, axis=1, kind='stable')[:, :k]
+    return order, np.take_along_axis(block, order, axis=1)
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('k', [1, 3, 8, 40])
+def test_top_k_rows_matches_a_stable_sort_on_tie_heavy_blocks(seed, k):
+    rng = np.random.default_rng(seed)
+    block = rng.integers(0, 4, size=(25, 30)).astype(np.float64)
+    top, scores = top_k_rows(block, k)
+    expected_top, expected_scores = _expected(block, k)
+    np.testing.assert_array_equal(top, expected_top)
+    np.testing.assert_array_equal(scores, expected_scores)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_top_k_rows_with_minus_inf_padding(seed):
+    rng = np.random.default_rng(seed)
+    block = rng.integers(0, 3, size=(12, 10)).astype(np.float32)
+    block[rng.random(block.shape) < 0.5] = -np.inf
+    # Rows with fewer finite scores than k are filled up with -inf columns by index
+    top, scores = top_k_rows(block, 6)
+    expected_top, expected_scores = _expected(block, 6)
+    np.testing.assert_array_equal(top, expected_top)
+    np.testing.assert_array_equal(scores, expected_scores)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('k', [2, 6])
+def test_top_k_rows_with_nan_padding(seed, k):
+    rng = np.random.default_rng(seed)
+    block = rng.integers(0, 3, size=(12, 10)).astype(np.float64)
+    block[rng.random(block.shape) < 0.6] = np.nan
+    # NaN ranks last; rows short of k non-NaN scores are filled with NaN columns by index
+    top, scores = top_k_rows(block, k)
+    expected_top, expected_scores = _expected(block, k)
+    np.testing.assert_array_equal(top, expected_top)
+    np.testing.assert_array_equal(scores, expected_scores)
+
+
+def test_top_k_rows_edge_sizes():
+    block = np.array([[2.0, 1.0, 2.0]])
+    assert top_k_rows(block, 0)[0].shape == (1, 0)
+    np.testing.assert_array_equal(top_k_rows(block, 10)[0], [[0, 2, 1]])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_top_n_matches_a_stable_sort_and_skips_nan(seed):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(0, 5, size=50).astype(np.float64)
+    scores[rng.random(50) < 0.3] = np.nan
+    valid = np.flatnonzero(~np.isnan(scores))
+    expected = valid[np.argsort(-scores[valid], kind='stable')]
+    for n in (0, 1, 5, 20, 100):
+        np.testing.assert_array_equal(top_n(scores, n), expected[:n])
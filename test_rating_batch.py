@@ -0,0 +1,102 @@
+import importlib
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rating_batch import ratings_frame, request_items, validate_ratings
+
+MOVIE_IDS = np.array([1, 2, 3])
+
+
+def _validate(rows):
+    return validate_ratings(pd.DataFrame(rows, columns=['user_id', 'movie_id', 'rating']), MOVIE_IDS)
+
+
+def test_valid_rows_get_compact_dtypes_and_last_duplicate_wins():
+    rows, rejected = _validate([(1, 1, 4), (1, 2, 3), (1, 1, 5)])
+    assert rejected == []
+    assert rows.dtypes.tolist() == [np.int32, np.int32, np.int8]
+    assert sorted(rows.itertuples(index=False, name=None)) == [(1, 1, 5), (1, 2, 3)]
+
+
+@pytest.mark.parametrize('user_id', [0, -3, 2 ** 31, 2 ** 40, 1.5, 'x', None])
+def test_rejects_user_ids_outside_int32(user_id):
+    rows, rejected = _validate([(user_id, 1, 4), (7, 2, 4)])
+    assert rejected == [(0, 'Invalid user_id')]
+    assert rows['user_id'].tolist() == [7]
+
+
+def test_rejects_ratings_out_of_range_and_unknown_movies():
+    rows, rejected = _validate([(1, 1, 0), (1, 1, 6), (1, 9, 4), (1, 2 ** 40, 4), (1, 3, 5)])
+    assert rejected == [
+        (0, 'Rating must be between 1 and 5'),
+        (1, 'Rating must be between 1 and 5'),
+        (2, 'Movie not found'),
+        (3, 'Invalid movie_id'),
+    ]
+    assert len(rows) == 1
+
+
+@pytest.mark.parametrize('data', [None, 'ratings', 5, {'ratings': 5}, [[1]], [[1, 4], {'movie_id': 1}]])
+def test_malformed_bodies_have_no_frame(data):
+    assert ratings_frame(request_items(data), ('movie_id', 'rating')) is None
+
+
+def test_bare_list_body_is_accepted():
+    frame = ratings_frame(request_items([[1, 4], [2, 5]]), ('movie_id', 'rating'))
+    assert frame.to_numpy().tolist() == [[1, 4], [2, 5]]
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('app')
+    saved = dict(os.environ)
+    os.environ.update({'RECOMMENDER_DB': str(tmp / 'ratings.db'), 'MODEL_SNAPSHOT': str(tmp / 'model.snapshot')})
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        app = importlib.import_module('app')
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+        yield client
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+@pytest.mark.parametrize('body', ['[1, 4]', '{"ratings": 3}', '"ratings"', '{"ratings": [[1]]}', 'not json'])
+def test_rate_movies_rejects_bad_bodies(client, body):
+    response = client.post('/api/rate_movies', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_rate_movies_rejects_a_batch_with_no_valid_rows(client):
+    response = client.post('/api/rate_movies', json={'ratings': [[1, 9]]})
+    assert response.status_code == 400
+    assert response.get_json()['rejected'] == [{'index': 0, 'error': 'Rating must be between 1 and 5'}]
+
+
+def test_rate_movies_accepts_a_bare_list(client):
+    response = client.post('/api/rate_movies', json=[[1, 4], [2, 5]])
+    assert response.status_code == 200
+    assert response.get_json()['accepted'] == 2
+
+
+@pytest.mark.parametrize('user_ids', [[1, True], 'all', [1, 2.0]])
+def test_batch_recommend_rejects_non_integer_user_ids(client, user_ids):
+    response = client.post('/api/recommend/batch', json={'user_ids': user_ids})
+    assert response.status_code == 400
+
+
+def test_batch_recommend_caps_the_number_of_users(client):
+    app = importlib.import_module('app')
+    response = client.post('/api/recommend/batch', json={'user_ids': list(range(app.MAX_BATCH_USERS + 1))})
+    assert response.status_code == 413
+    response = client.post('/api/recommend/batch', json={'user_ids': [1, 2]})
+    assert response.status_code == 200
+    assert set(response.get_json()) == {'1', '2'}
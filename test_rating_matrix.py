@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+import rating_matrix
+from rating_matrix import IdIndex, RatingMatrix
+
+
+def test_id_index_finds_unsorted_ids():
+    index = IdIndex([30, 10, 20])
+    assert index[30] == 0
+    assert index[10] == 1
+    assert index[20] == 2
+    assert 15 not in index
+    assert index.get(40) is None
+
+
+def test_id_index_finds_ids_added_later():
+    index = IdIndex([30, 10, 20])
+    index.add(5, 3)
+    assert index[5] == 3
+    assert len(index) == 4
+    assert index.positions([20, 5, 99, 30]).tolist() == [2, 3, -1, 0]
+
+
+def test_id_index_attaches_prebuilt_order():
+    ids = np.array([30, 10, 20])
+    order = np.argsort(ids, kind='stable')
+    index = IdIndex(ids, order, ids[order])
+    assert [index[i] for i in (10, 20, 30)] == [1, 2, 0]
+
+
+def _chunk(rows):
+    return pd.DataFrame(rows, columns=['user_id', 'movie_id', 'rating'])
+
+
+def _rating(matrix, user_id, movie_id):
+    return matrix.to_csr()[matrix.user_index[user_id], matrix.movie_index[movie_id]]
+
+
+def test_from_chunks_keeps_latest_rating():
+    chunks = [_chunk([(1, 10, 2), (2, 10, 5)]), _chunk([(1, 10, 4), (1, 20, 3)])]
+    matrix = RatingMatrix.from_chunks(chunks, [10, 20], backend='sparse')
+    assert _rating(matrix, 1, 10) == 4
+    assert _rating(matrix, 1, 20) == 3
+    assert _rating(matrix, 2, 10) == 5
+    assert matrix.to_csr().nnz == 3
+
+
+def test_from_chunks_keeps_latest_rating_across_compaction(monkeypatch):
+    # Compact after every chunk, so older ratings are merged before newer ones arrive
+    monkeypatch.setattr(rating_matrix, 'COMPACT_EVERY', 1)
+    chunks = [_chunk([(1, 10, 2), (2, 20, 1)]), _chunk([(3, 10, 5), (1, 10, 4)]), _chunk([(2, 20, 3)])]
+    matrix = RatingMatrix.from_chunks(chunks, [10, 20], backend='sparse')
+    assert _rating(matrix, 1, 10) == 4
+    assert _rating(matrix, 2, 20) == 3
+    assert _rating(matrix, 3, 10) == 5
+    assert matrix.to_csr().nnz == 3
+
+
+def test_from_chunks_skips_movies_outside_catalogue():
+    matrix = RatingMatrix.from_chunks([_chunk([(1, 10, 4), (1, 99, 5)])], [10, 20], backend='sparse')
+    assert matrix.to_csr().nnz == 1
@@ -0,0 +1,99 @@
+import time
+
+from cache import RecommendationCache
+from rebuild_scheduler import RebuildScheduler
+
+
+class Snapshot:
+    cache = None
+
+    def __init__(self, previous):
+        self.previous = previous
+
+
+class CachedSnapshot(Snapshot):
+    def __init__(self, previous):
+        super().__init__(previous)
+        self.cache = RecommendationCache()
+
+
+class Builds:
+    """Build callback that records the previous snapshot of every build"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, previous):
+        self.calls.append(previous)
+        return Snapshot(previous)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_burst_of_ratings_coalesces_into_one_build():
+    builds = Builds()
+    scheduler = RebuildScheduler(builds, debounce=0.2, max_delay=5.0)
+    try:
+        initial = scheduler.current()
+        for movie_id in range(5):
+            scheduler.submit(1, movie_id, 4)
+        _wait_for(lambda: scheduler.stats()['builds'] == 1)
+        time.sleep(0.3)
+        assert scheduler.stats()['builds'] == 1
+        assert scheduler.stats()['pending_ratings'] == 0
+        # The initial build has no previous snapshot; rebuilds start from the served one
+        assert builds.calls == [None, initial]
+        assert scheduler.current().previous is initial
+    finally:
+        scheduler.stop()
+
+
+def test_max_delay_bounds_a_steady_stream():
+    scheduler = RebuildScheduler(Builds(), debounce=10.0, max_delay=0.2)
+    try:
+        started = time.monotonic()
+        # Ratings keep arriving faster than the debounce, which would postpone forever
+        while scheduler.stats()['builds'] == 0:
+            assert time.monotonic() - started < 5.0, 'max_delay did not force a build'
+            scheduler.submit(1, 1, 4)
+            time.sleep(0.02)
+    finally:
+        scheduler.stop()
+
+
+def test_flush_builds_immediately():
+    scheduler = RebuildScheduler(Builds(), debounce=10.0, max_delay=10.0)
+    try:
+        scheduler.submit_many([(1, 1, 4), (2, 1, 5)])
+        assert scheduler.stats()['pending_ratings'] == 2
+        started = time.monotonic()
+        assert scheduler.flush(timeout=5.0)
+        assert time.monotonic() - started < 5.0
+        assert scheduler.stats()['builds'] == 1
+        assert scheduler.stats()['pending_ratings'] == 0
+    finally:
+        scheduler.stop()
+
+
+def test_new_snapshot_gets_its_own_cache_without_stale_entries():
+    scheduler = RebuildScheduler(CachedSnapshot, debounce=10.0, max_delay=10.0)
+    try:
+        old = scheduler.current()
+        old.cache.put('rated', 'old result', tags=[('user', 1)])
+        old.cache.put('other', 'kept', tags=[('user', 2)])
+        scheduler.submit(1, 1, 4)
+        assert scheduler.flush(timeout=5.0)
+        new = scheduler.current()
+        assert new.cache is not old.cache
+        assert new.cache.get('rated') is None
+        assert new.cache.get('other') == 'kept'
+        # A request still running on the old snapshot cannot poison the new one
+        old.cache.put('rated', 'old result', tags=[('user', 1)])
+        assert new.cache.get('rated') is None
+    finally:
+        scheduler.stop()
@@ -0,0 +1,35 @@
+import os
+
+from recommendation_system import MovieRecommender
+from shared_model import SharedModel, current_generation, publish, publish_if_missing
+
+MOVIES_FILE = 'movies_data.csv'
+RATINGS_FILE = 'user_ratings.csv'
+
+
+def _build():
+    return MovieRecommender(MOVIES_FILE, RATINGS_FILE, cache_size=0)
+
+
+def test_publish_if_missing_builds_only_once(tmp_path):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return _build()
+
+    assert publish_if_missing(build, tmp_path) == 1
+    assert publish_if_missing(build, tmp_path) == 1
+    assert len(builds) == 1
+    assert current_generation(tmp_path) == 1
+
+
+def test_shared_model_follows_a_superseded_generation(tmp_path):
+    publish(_build(), tmp_path, keep=1)
+    shared = SharedModel(tmp_path, check_interval=0)
+    # Generation 1 disappears between reading CURRENT and mapping the file
+    publish(_build(), tmp_path, keep=1)
+    assert not os.path.exists(tmp_path / 'model-1.bin')
+    shared._attach(1)
+    assert shared.generation == 2
+    assert shared.get() is shared.recommender is not None